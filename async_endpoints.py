@@ -0,0 +1,282 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import asyncio
+import datetime
+
+import endpoints
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, only needed for this module
+    aiohttp = None
+
+HTTP_CONNECTIONS_LIMIT = 100  # total connections per connector
+HTTP_CONNECTIONS_LIMIT_PER_HOST = 8
+
+
+def create_http_session(connector=None, timeout=endpoints.HTTP_TIMEOUT):
+    '''
+    asyncio counterpart of endpoints.get_http_session, all async endpoint functions create their
+    sessions here if not given one.
+
+    Usage:  session = create_http_session()
+            ..
+            await session.close()
+    Before: @connector is optional, an aiohttp.TCPConnector to share between sessions, a new one
+            limited to HTTP_CONNECTIONS_LIMIT connections (HTTP_CONNECTIONS_LIMIT_PER_HOST per
+            host) is created if omitted. @timeout is optional, (connect timeout, read timeout) in
+            seconds. Must be called from within a running event loop.
+    After:  @session is a new aiohttp.ClientSession with default User-Agent. Sessions sharing a
+            @connector share its keep alive connections but each has its own cookies, so
+            concurrent ISK exchange rate batches (which rely on server side form state) should
+            each get their own session.
+    '''
+    if aiohttp is None:
+        raise Exception(
+            'async_endpoints requires aiohttp, install it with '
+            '"pip install -r requirements-async.txt".'
+        )
+    connector_owner = connector is None
+    if connector is None:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_CONNECTIONS_LIMIT,
+            limit_per_host=HTTP_CONNECTIONS_LIMIT_PER_HOST
+        )
+    return aiohttp.ClientSession(
+        connector=connector,
+        connector_owner=connector_owner,
+        timeout=aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1]),
+        headers={'User-Agent': endpoints.USER_AGENT}
+    )
+
+
+class _Session(object):
+    '''
+    Async context manager providing @session, or a new session closed on exit if @session is None.
+    '''
+
+    def __init__(self, session=None):
+        self.session = session
+        self.owner = session is None
+
+    async def __aenter__(self):
+        if self.owner:
+            self.session = create_http_session()
+        return self.session
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.owner:
+            await self.session.close()
+
+
+async def _request(session, method, url, headers=None, data=None, raise_for_status=True):
+    '''
+    Sends request, returns tuple of response status and response body.
+    '''
+    async with session.request(method, url, headers=headers, data=data) as res:
+        content = await res.read()
+        if raise_for_status:
+            res.raise_for_status()
+        return res.status, content
+
+
+async def get_isk_exchange_rate(req_date, logger=None, session=None):
+    '''
+    asyncio version of endpoints.get_isk_exchange_rate.
+
+    Usage:  res_data = await get_isk_exchange_rate(req_date)
+    Before: @req_date is a datetime.datetime object containing date in the range 1981-01-01 to our
+            present date. @session is optional, see create_http_session.
+    After:  @res_data is a dict containing exchange rate info for given @req_date if available,
+            see endpoints.get_isk_exchange_rate.
+    '''
+    results = [
+        data async for data in get_isk_exchange_rates([req_date], logger=logger, session=session)
+    ]
+    return results[0]
+
+
+async def get_isk_exchange_rates(dates, logger=None, session=None):
+    '''
+    asyncio version of endpoints.get_isk_exchange_rates, reading the ASP.NET form state once and
+    reusing it for every date, one request at a time.
+
+    Usage:  async for res_data in get_isk_exchange_rates(dates): ..
+    Before: @dates is an iterable of datetime.datetime objects, each in the range 1981-01-01 to our
+            present date. @session is optional, see create_http_session.
+    After:  Yields a dict per date in @dates, in the same order, see
+            endpoints.get_isk_exchange_rate.
+    '''
+    async with _Session(session) as session:
+        form_state = None
+        for req_date in dates:
+            data = endpoints._isk_exchange_rate_data(req_date)
+            if endpoints._isk_exchange_rate_unavailable(req_date, data, logger):
+                yield data
+                continue
+            status, content = None, None
+            for attempt in range(2):
+                if form_state is None:
+                    status, content = await _request(
+                        session,
+                        'GET',
+                        endpoints.ISK_EXCHANGE_RATE_URL
+                    )
+                    form_state = endpoints._parse_isk_exchange_rate_form_state(content)
+                await asyncio.sleep(0.8)  # just to look polite
+                headers, form_data = endpoints._isk_exchange_rate_form_post(form_state, req_date)
+                status, content = await _request(
+                    session,
+                    'POST',
+                    endpoints.ISK_EXCHANGE_RATE_URL,
+                    headers=headers,
+                    data=form_data,
+                    raise_for_status=False
+                )
+                if not endpoints._isk_exchange_rate_form_rejected(status, content, req_date):
+                    break
+                if logger is not None:
+                    logger.info('Form state rejected by sedlabanki.is, refreshing ..')
+                form_state = None
+            if status >= 400:
+                raise Exception('sedlabanki.is responded with HTTP status %s.' % (status, ))
+            if endpoints._isk_exchange_rate_form_rejected(status, content, req_date):
+                yield endpoints._isk_exchange_rate_not_shown(data, logger)
+                continue
+            yield endpoints._parse_isk_exchange_rate_response(content, req_date, data, logger)
+
+
+async def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None, session=None):
+    '''
+    asyncio version of endpoints.get_crude_oil_rate_history, the HTTP cache is not used so
+    NOT_MODIFIED is never returned.
+    '''
+    start_date, end_date = endpoints._crude_oil_rate_history_window(date_a, date_b)
+    async with _Session(session) as session:
+        status, content = await _request(session, 'GET', endpoints.CRUDE_OIL_RATE_HISTORY_URL)
+    return endpoints._parse_crude_oil_rate_history_page(
+        content,
+        start_date,
+        end_date,
+        logger=logger
+    )
+
+
+async def get_crude_oil_rate_history_fallback(logger=None, session=None):
+    '''
+    asyncio version of endpoints.get_crude_oil_rate_history_fallback, the HTTP cache is not used
+    so NOT_MODIFIED is never returned.
+    '''
+    if logger is not None:
+        logger.info('Fetching fallback crude data from markets.businessinsider.com ..')
+    async with _Session(session) as session:
+        status, content = await _request(session, 'GET', endpoints.CRUDE_OIL_FALLBACK_URL)
+        now = datetime.datetime.utcnow()
+        chart_data_url = endpoints._crude_oil_fallback_chart_data_url(content, now)
+        status, content = await _request(
+            session,
+            'GET',
+            chart_data_url,
+            headers=endpoints.CRUDE_OIL_FALLBACK_CHART_DATA_HEADERS
+        )
+    data = endpoints._parse_crude_oil_fallback_chart_data(content, now)
+    if logger is not None:
+        logger.info('Successfully fetched fallback crude data from markets.businessinsider.com')
+    return data
+
+
+async def get_icelandic_fuel_price_history(req_date=None, logger=None, session=None,
+                                           gasvaktin_trends_content=None, gasvaktin_state=None,
+                                           fib_last_prices=None):
+    '''
+    asyncio version of endpoints.get_icelandic_fuel_price_history, the HTTP cache is not used so
+    NOT_MODIFIED is never returned. Parsing the trends data and the Gasvaktin mean price
+    calculation run in the default executor, so other requests aren't blocked meanwhile.
+    '''
+    data = {
+        'petrol': {},
+        'diesel': {}
+    }
+    headers = {'User-Agent': endpoints.USER_AGENT}
+    last_petrol_price = None
+    last_diesel_price = None
+    async with _Session(session) as session:
+        if fib_last_prices is not None:
+            if logger is not None:
+                logger.info('FÍB data already stored, skipping.')
+            last_petrol_price = fib_last_prices['petrol']
+            last_diesel_price = fib_last_prices['diesel']
+        elif req_date is None or req_date < endpoints.GASVAKTIN_BEGINNING:
+            if logger is not None:
+                logger.info('Fetching and parsing FÍB data ..')
+            await _request(session, 'GET', endpoints.FIB_FUEL_PRICE_URL, headers=headers)
+            await asyncio.sleep(0.5)  # just to look polite
+            status, content = await _request(
+                session,
+                'GET',
+                endpoints.FIB_MEAN_PRICES_PETROL_URL,
+                headers=headers
+            )
+            data['petrol'], last_petrol_price = endpoints._parse_fib_mean_prices(
+                content.splitlines(),
+                req_date
+            )
+            await asyncio.sleep(0.2)  # just to look polite
+            status, content = await _request(
+                session,
+                'GET',
+                endpoints.FIB_MEAN_PRICES_DIESEL_URL,
+                headers=headers
+            )
+            data['diesel'], last_diesel_price = endpoints._parse_fib_mean_prices(
+                content.splitlines(),
+                req_date
+            )
+        if logger is not None:
+            logger.info('Fetching and parsing Gasvaktin data ..')
+        if gasvaktin_trends_content is None:
+            status, gasvaktin_trends_content = await _request(
+                session,
+                'GET',
+                endpoints.GASVAKTIN_TRENDS_URL,
+                headers=headers
+            )
+    await asyncio.get_running_loop().run_in_executor(
+        None,
+        endpoints._add_gasvaktin_mean_price_changes,
+        data,
+        gasvaktin_trends_content,
+        req_date,
+        last_petrol_price,
+        last_diesel_price,
+        gasvaktin_state
+    )
+    if logger is not None:
+        logger.info('Finished parsing icelandic fuel price data.')
+    return data
+
+
+async def get_isk_inflation_index_history(logger=None, last_months=None, session=None):
+    '''
+    asyncio version of endpoints.get_isk_inflation_index_history, the HTTP cache is not used so
+    NOT_MODIFIED is never returned.
+    '''
+    headers, form_data_for_post = endpoints._isk_inflation_index_request(last_months)
+    async with _Session(session) as session:
+        await _request(session, 'GET', endpoints.ISK_INFLATION_INDEX_LANDING_URL)
+        await asyncio.sleep(0.1)
+        status, content = await _request(
+            session,
+            'POST',
+            endpoints.ISK_INFLATION_INDEX_URL,
+            headers=headers,
+            data=form_data_for_post
+        )
+    return endpoints._parse_isk_inflation_index_csv(content)
+
+
+if __name__ == '__main__':
+    import pprint
+    print('running get_crude_oil_rate_history_fallback ..')
+    pprint.pprint(asyncio.run(get_crude_oil_rate_history_fallback()))
@@ -0,0 +1,358 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import argparse
+import base64
+import datetime
+import glob
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import lxml.etree
+
+import comparison
+import database.db
+import endpoints
+
+
+def synthetic_isk_exchange_rate_page(req_date, currencies_count=35, seed=0, nested=False):
+    '''
+    Generates a page resembling a sedlabanki.is exchange rate result page, with a large ASP.NET
+    __VIEWSTATE, navigation, scripts and footer around the two tables we're interested in. Used
+    when no recorded pages are provided. If @nested is True the shown date table is nested in the
+    last row of the rates table, to check the parsers agree on table order.
+    '''
+    rand = random.Random(seed)
+    viewstate = base64.b64encode(bytes(rand.getrandbits(8) for _ in range(48000))).decode('ascii')
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8"/><title>Opinber gengisskráning</title>'
+    ]
+    for i in range(20):
+        parts.append('<script>var config_%s = %s;</script>' % (i, 'x' * 800))
+    parts.append('</head><body><form method="post" action="./" id="form1">')
+    parts.append('<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="%s" />' % (
+        viewstate,
+    ))
+    parts.append(
+        '<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" '
+        'value="E3C22D2F" />'
+    )
+    parts.append(
+        '<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="%s" />' % (
+            viewstate[:4000],
+        )
+    )
+    parts.append('<nav><ul>')
+    for i in range(300):
+        parts.append(
+            '<li><a href="/sida-%s/">Síða %s</a><ul><li><span>%s</span></li></ul></li>' % (
+                i, i, 'Undirsíða'
+            )
+        )
+    parts.append('</ul></nav><div class="content">')
+    parts.append('<table class="gengi"><tr><th>Mynt</th><th>Kóði</th><th>Miðgengi</th></tr>')
+    for i in range(currencies_count):
+        parts.append('<tr><td> Gjaldmiðill %s </td><td>C%02d</td><td>%s,%s</td></tr>' % (
+            i, i, rand.randint(1, 200), rand.randint(0, 999)
+        ))
+    shown_date_table = '<table><tr><td><span>Skráning: %s</span></td></tr></table>' % (
+        req_date.strftime('%d.%m.%Y'),
+    )
+    if nested:
+        parts.append('<tr><td colspan="3">%s</td></tr></table>' % (shown_date_table, ))
+    else:
+        parts.append('</table>')
+        parts.append(shown_date_table)
+    parts.append('</div><footer>')
+    for i in range(400):
+        parts.append('<div class="footer-item"><p>Seðlabanki Íslands %s</p></div>' % (i, ))
+    parts.append('</footer></form></body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def parse_isk_exchange_rate_page_tree(content):
+    '''
+    The previous, tree building, way of extracting the rate rows and the shown date from a
+    sedlabanki.is result page, kept here as the baseline.
+    '''
+    html = lxml.etree.fromstring(content, lxml.etree.HTMLParser())
+    tables = html.findall('.//table')
+    shown_date_str = tables[1].find('.//tr/td/span').text
+    rows = []
+    for row in tables[0].findall('.//tr'):
+        if row.find('.//th') is not None:
+            continue
+        rows.append(tuple(column.text for column in row.findall('.//td')))
+    return shown_date_str, rows
+
+
+def parse_isk_exchange_rate_page_pull(content):
+    page = endpoints.parse_isk_exchange_rate_page(content, tables_count=2, form_inputs=False)
+    tables = page['tables']
+    shown_date_str = tables[1].find('.//tr/td/span').text
+    rows = []
+    for row in tables[0].findall('.//tr'):
+        if row.find('.//th') is not None:
+            continue
+        rows.append(tuple(column.text for column in row.findall('.//td')))
+    return shown_date_str, rows
+
+
+def count_isk_exchange_rate_page_tree_elements(content):
+    html = lxml.etree.fromstring(content, lxml.etree.HTMLParser())
+    return sum(1 for _ in html.iter())
+
+
+def count_isk_exchange_rate_page_pull_elements(content):
+    page = endpoints.parse_isk_exchange_rate_page(content, tables_count=2, form_inputs=False)
+    root = page['tables'][0].getroottree().getroot()
+    return sum(1 for _ in root.iter())
+
+
+def benchmark_isk_exchange_rate_parser(pages_directory=None, repeat=50):
+    pages = []
+    if pages_directory is not None:
+        for filename in sorted(glob.glob(os.path.join(pages_directory, '*.html'))):
+            with open(filename, mode='rb') as page_file:
+                pages.append((os.path.basename(filename), page_file.read()))
+    if len(pages) == 0:
+        req_date = datetime.datetime(2024, 1, 5)
+        pages.append(('synthetic', synthetic_isk_exchange_rate_page(req_date)))
+        pages.append((
+            'synthetic-nested',
+            synthetic_isk_exchange_rate_page(req_date, nested=True)
+        ))
+    print('Parsing %s sedlabanki.is page(s), %s times each ..' % (len(pages), repeat))
+    print('%-16s %10s %10s %10s %14s %14s' % (
+        'page', 'size KiB', 'tree ms', 'pull ms', 'tree elements', 'pull elements'
+    ))
+    for name, content in pages:
+        assert(
+            parse_isk_exchange_rate_page_tree(content) ==
+            parse_isk_exchange_rate_page_pull(content)
+        )
+        timings = {}
+        for label, func in (
+            ('tree', parse_isk_exchange_rate_page_tree),
+            ('pull', parse_isk_exchange_rate_page_pull)
+        ):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func(content)
+            timings[label] = (time.perf_counter() - start) * 1000.0 / repeat
+        print('%-16s %10.1f %10.3f %10.3f %14s %14s' % (
+            name[:16],
+            len(content) / 1024.0,
+            timings['tree'],
+            timings['pull'],
+            count_isk_exchange_rate_page_tree_elements(content),
+            count_isk_exchange_rate_page_pull_elements(content)
+        ))
+
+
+def synthetic_gasvaktin_trends(years=20, companies_count=9, seed=0):
+    '''
+    Generates Gasvaktin trends data resembling trends.min.json, @years of price changes from
+    2016-04-19 for @companies_count companies, each changing prices every few days.
+    '''
+    rand = random.Random(seed)
+    start = datetime.datetime(2016, 4, 19)
+    end = start + datetime.timedelta(days=int(365.25 * years))
+    trends = {}
+    for i in range(companies_count):
+        changes = []
+        current = start + datetime.timedelta(hours=rand.randint(0, 24 * 30) if i > 0 else 8)
+        petrol = 190.0 + rand.uniform(-10.0, 10.0)
+        diesel = 180.0 + rand.uniform(-10.0, 10.0)
+        while current < end:
+            petrol = round(max(100.0, petrol + rand.uniform(-3.0, 3.0)), 1)
+            diesel = round(max(100.0, diesel + rand.uniform(-3.0, 3.0)), 1)
+            changes.append({
+                'timestamp': current.strftime('%Y-%m-%dT%H:%M'),
+                'stations_count': rand.randint(0, 60) if i > 0 else rand.randint(1, 60),
+                'mean_bensin95': petrol,
+                'mean_diesel': diesel
+            })
+            current += datetime.timedelta(hours=rand.randint(12, 24 * 7))
+        trends['c%s' % (i, )] = changes
+    return trends, end
+
+
+def calculate_gasvaktin_mean_price_changes_scan(gasvaktin_trends, end_date):
+    '''
+    The previous way of calculating daily national mean price, scanning every company's change
+    list from the start for each day, kept here as the baseline.
+    '''
+    petrol = {}
+    diesel = {}
+    last_petrol_price = None
+    last_diesel_price = None
+    current_date = datetime.datetime(2016, 4, 19)
+    while current_date.strftime('%Y-%m-%d') < end_date.strftime('%Y-%m-%d'):
+        current_date_str = current_date.strftime('%Y-%m-%dT23:59')
+        current_prices = {}
+        for company_key in gasvaktin_trends:
+            for change in gasvaktin_trends[company_key]:
+                if change['timestamp'] < current_date_str:
+                    current_prices[company_key] = change
+                else:
+                    break
+        number_of_stations = 0
+        total_petrol_price = 0.0
+        total_diesel_price = 0.0
+        for company_key in current_prices:
+            if current_prices[company_key]['stations_count'] == 0:
+                continue
+            stations_count = current_prices[company_key]['stations_count']
+            number_of_stations += stations_count
+            total_petrol_price += (current_prices[company_key]['mean_bensin95'] * stations_count)
+            total_diesel_price += (current_prices[company_key]['mean_diesel'] * stations_count)
+        current_petrol_price = round((total_petrol_price / number_of_stations), 2)
+        current_diesel_price = round((total_diesel_price / number_of_stations), 2)
+        if current_petrol_price != last_petrol_price:
+            petrol[current_date.strftime('%Y-%m-%d')] = current_petrol_price
+            last_petrol_price = current_petrol_price
+        if current_diesel_price != last_diesel_price:
+            diesel[current_date.strftime('%Y-%m-%d')] = current_diesel_price
+            last_diesel_price = current_diesel_price
+        current_date += datetime.timedelta(days=1)
+    return petrol, diesel
+
+
+def benchmark_fuel_mean_price(years=20, repeat=3):
+    gasvaktin_trends, end_date = synthetic_gasvaktin_trends(years=years)
+    changes_count = sum(len(changes) for changes in gasvaktin_trends.values())
+    print('Calculating daily national mean fuel price, %s years, %s companies, %s changes, '
+          '%s times each ..' % (years, len(gasvaktin_trends), changes_count, repeat))
+    assert(
+        calculate_gasvaktin_mean_price_changes_scan(gasvaktin_trends, end_date) ==
+        endpoints.calculate_gasvaktin_mean_price_changes(gasvaktin_trends, end_date=end_date)
+    )
+    timings = {}
+    for label, func in (
+        ('scan', lambda: calculate_gasvaktin_mean_price_changes_scan(gasvaktin_trends, end_date)),
+        ('sweep', lambda: endpoints.calculate_gasvaktin_mean_price_changes(
+            gasvaktin_trends,
+            end_date=end_date
+        ))
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        timings[label] = (time.perf_counter() - start) * 1000.0 / repeat
+    print('%10s %10s' % ('scan ms', 'sweep ms'))
+    print('%10.1f %10.1f' % (timings['scan'], timings['sweep']))
+
+
+def synthetic_isk_rate_data_list(days=5000, currencies_count=10, seed=0):
+    '''
+    Generates ISK rate data, as returned by endpoints.get_isk_exchange_rate, for @days business
+    days from 1981-01-02.
+    '''
+    rand = random.Random(seed)
+    isk_data_list = []
+    current_date = datetime.datetime(1981, 1, 2)
+    while len(isk_data_list) < days:
+        if current_date.weekday() not in (5, 6):
+            currencies = {}
+            for i in range(currencies_count):
+                currencies['c%02d' % (i, )] = {
+                    'name': 'Gjaldmiðill %s' % (i, ),
+                    'code': 'C%02d' % (i, ),
+                    'buy': None,
+                    'sell': None,
+                    'mean': round(rand.uniform(1.0, 200.0), 3)
+                }
+            isk_data_list.append({
+                'date': current_date.strftime('%Y-%m-%d'),
+                'currencies': currencies,
+                'status': {'success': True, 'holiday': False, 'msg': ''}
+            })
+        current_date += datetime.timedelta(days=1)
+    return isk_data_list
+
+
+def benchmark_sqlite_profile(days=5000, batch_size=10):
+    isk_data_list = synthetic_isk_rate_data_list(days=days)
+    rows_count = sum(len(isk_data['currencies']) for isk_data in isk_data_list)
+    print('Ingesting %s ISK rate rows (%s days, commit every %s days) and exporting them to CSV, '
+          'per SQLite profile ..' % (rows_count, days, batch_size))
+    print('%-12s %10s %12s %10s %12s' % (
+        'profile', 'ingest s', 'ingest rows/s', 'export s', 'export rows/s'
+    ))
+    cwd = os.getcwd()
+    for profile in database.db.SQLITE_PROFILES:
+        directory = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(directory, 'data'))
+            os.chdir(directory)  # export writes to data/ relative to working directory
+            database.db.setup_connection(
+                'sqlite:///%s' % (os.path.join(directory, 'benchmark.sqlite'), ),
+                sqlite_profile=profile
+            )
+            database.db.init_db()
+            currency_ids = comparison.get_currency_ids(database.db)
+            start = time.perf_counter()
+            for i in range(0, len(isk_data_list), batch_size):
+                comparison.store_isk_rate_data(
+                    database.db,
+                    isk_data_list[i:i + batch_size],
+                    currency_ids=currency_ids
+                )
+            ingest_time = time.perf_counter() - start
+            start = time.perf_counter()
+            comparison.write_isk_rate_history_to_files(database.db)
+            export_time = time.perf_counter() - start
+            print('%-12s %10.2f %12.0f %10.2f %12.0f' % (
+                profile,
+                ingest_time,
+                rows_count / ingest_time,
+                export_time,
+                rows_count / export_time
+            ))
+        finally:
+            database.db.session.remove()
+            database.db.engine.dispose()
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gasvaktin Comparison benchmarks')
+    parser.add_argument(
+        'benchmark', choices=['isk-parser', 'fuel-mean', 'sqlite-profile'],
+        help='Benchmark to run.'
+    )
+    parser.add_argument('--pages', default=None, help=(
+        'Directory of recorded sedlabanki.is result pages (*.html) for the isk-parser benchmark, '
+        'a synthetic page is used if omitted.'
+    ))
+    parser.add_argument('--years', type=int, default=20, help=(
+        'Years of synthetic Gasvaktin trends data for the fuel-mean benchmark.'
+    ))
+    parser.add_argument('--days', type=int, default=5000, help=(
+        'Days of synthetic ISK rate data for the sqlite-profile benchmark.'
+    ))
+    parser.add_argument('--batch-size', type=int, default=10, help=(
+        'Days written per commit in the sqlite-profile benchmark.'
+    ))
+    parser.add_argument('--repeat', type=int, default=None, help=(
+        'Repetitions per measurement (default: 50 for isk-parser, 3 for fuel-mean).'
+    ))
+    pargs = parser.parse_args()
+    if pargs.benchmark == 'isk-parser':
+        benchmark_isk_exchange_rate_parser(
+            pages_directory=pargs.pages,
+            repeat=pargs.repeat or 50
+        )
+    elif pargs.benchmark == 'fuel-mean':
+        benchmark_fuel_mean_price(years=pargs.years, repeat=pargs.repeat or 3)
+    elif pargs.benchmark == 'sqlite-profile':
+        benchmark_sqlite_profile(days=pargs.days, batch_size=pargs.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,53 @@
 #!/usr/bin/python3
 # ----------------------------------------------------------------------------------------------- #
 import argparse
+import concurrent.futures
 import configparser
 import csv
 import datetime
+import glob
 import json
 import logging
 import operator
 import os
+import re
+import time
 
 import git
+import sqlalchemy
 
+from database.models import BankHoliday, FetchState
 from database.models import Currency, CrudeOilBarrelUSD, CrudeOilBarrelUSDfb, ExchangeRateOfISK
 from database.models import DieselPriceIcelandLiterISK, PetrolPriceIcelandLiterISK
+from database.models import crude_oil_barrel_usd_merged
+from database.models.utility_columns import EpochDay
 import database.db
 import endpoints
+import icelandic_holidays
 
 Logger = None
 
+# crude oil rates in the CSV data file are the merged primary and fallback series, rates of the
+# last days are loaded as fallback records so the primary source can still replace them
+CSV_CRUDE_OIL_FALLBACK_DAYS = 31
+
+# dates are epoch day integers here, see isk_rate_gaps_statement
+ISK_RATE_GAPS_QUERY = '''
+WITH RECURSIVE calendar(date) AS (
+    SELECT :start_date WHERE :start_date < :end_date
+    UNION ALL
+    SELECT calendar.date + 1 FROM calendar
+    WHERE calendar.date + 1 < :end_date
+)
+SELECT calendar.date
+FROM calendar
+WHERE strftime('%w', calendar.date * 86400, 'unixepoch') NOT IN ('0', '6') AND
+    calendar.date NOT IN (SELECT bank_holiday.date FROM bank_holiday) AND
+    NOT EXISTS (
+        SELECT 1 FROM exchange_rate_of_isk WHERE exchange_rate_of_isk.date = calendar.date
+    )
+'''
+
 
 def setup_logger():
     logger = logging.getLogger('comparison')
@@ -32,6 +62,64 @@ def setup_logger():
     return logger
 
 
+def store_dated_values(db, model, value_column, data):
+    '''
+    Writes date keyed values to the table of @model, which has a unique date column and a
+    @value_column column. @data is a dict mapping 'YYYY-MM-DD' date strings to values.
+
+    Existing dates in the incoming range are loaded with a single query and new rows are inserted
+    with a single INSERT OR IGNORE executemany statement. Doesn't commit.
+
+    Returns list of (date, value) tuples written.
+    '''
+    if len(data) == 0:
+        return []
+    existing_dates = set(date for date, in db.session.query(model.date).filter(
+        min(data.keys()) <= model.date
+    ).filter(
+        model.date <= max(data.keys())
+    ))
+    inserted = sorted(
+        (date_key, value) for date_key, value in data.items() if date_key not in existing_dates
+    )
+    db.insert_or_ignore(model, [
+        {'date': date_key, value_column: value} for date_key, value in inserted
+    ])
+    return inserted
+
+
+def run_fetch_stages_concurrently(db, stages, logger=None):
+    '''
+    Runs fetch stages, callables without arguments talking to unrelated hosts, in parallel
+    threads so total time is close to that of the slowest stage. Each thread gets its own
+    database session (db.session is thread local) and database writes are serialized with
+    db.write_lock. Waits for all stages to finish, then re-raises the first failure if any.
+    '''
+    if logger is None:
+        logger = Logger
+
+    def run_stage(stage):
+        try:
+            start = time.time()
+            stage()
+            if logger is not None:
+                logger.info('Fetch stage %s finished in %.1f seconds.' % (
+                    stage.__name__,
+                    time.time() - start
+                ))
+        finally:
+            db.session.remove()  # close this thread's session
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        futures = [executor.submit(run_stage, stage) for stage in stages]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if len(errors) > 0:
+        for error in errors[1:]:
+            if logger is not None:
+                logger.error('Fetch stage failed: %s' % (repr(error), ))
+        raise errors[0]
+
+
 def fetch_crude_oil_rate_history(db, logger=None):
     if logger is None:
         logger = Logger
@@ -51,107 +139,572 @@ def fetch_crude_oil_rate_history(db, logger=None):
         logger.info('Fetching crude oil rate history ..')
     if last_record is not None:
         start_date = datetime.datetime.strptime(last_record.date, '%Y-%m-%d')
-    crude_data = endpoints.get_crude_oil_rate_history(date_a=start_date, logger=logger)
-    commit_required = False
-    for date_key in crude_data:
-        if date_key == today_str:
-            continue
-        record = db.session.query(CrudeOilBarrelUSD).filter_by(date=date_key).first()
-        if record is None:
-            record = CrudeOilBarrelUSD(date=date_key, rate=crude_data[date_key])
-            db.session.add(record)
-            commit_required = True
+    # rates dated today are left out, if content fetched on an earlier day had some we need it
+    # again even if unchanged, else those rates would only be stored once the sources change
+    skipped_date = get_fetch_state(db, 'crude_oil_skipped_date') or None
+    conditional = skipped_date is None or skipped_date == today_str
+    crude_data = endpoints.get_crude_oil_rate_history(
+        date_a=start_date,
+        logger=logger,
+        conditional=conditional
+    )
+    if crude_data is endpoints.NOT_MODIFIED:
+        crude_data = {}
+    skipped = crude_data.pop(today_str, None) is not None
     # fetch fallback crude oil rate data
-    fallback_crude_data = endpoints.get_crude_oil_rate_history_fallback(logger)
-    for date_key in fallback_crude_data:
-        if date_key == today_str:
-            continue
-        record = db.session.query(CrudeOilBarrelUSDfb).filter_by(date=date_key).first()
-        if record is None:
-            record = CrudeOilBarrelUSDfb(date=date_key, rate=fallback_crude_data[date_key])
-            db.session.add(record)
+    fallback_crude_data = endpoints.get_crude_oil_rate_history_fallback(
+        logger,
+        conditional=conditional
+    )
+    if fallback_crude_data is endpoints.NOT_MODIFIED:
+        fallback_crude_data = {}
+    if fallback_crude_data.pop(today_str, None) is not None:
+        skipped = True
+    with db.write_lock:  # serialized with other writers when fetch stages run concurrently
+        commit_required = len(store_dated_values(db, CrudeOilBarrelUSD, 'rate', crude_data)) > 0
+        if skipped:
+            set_fetch_state(db, 'crude_oil_skipped_date', today_str)
             commit_required = True
-    if commit_required:
-        db.session.commit()
+        elif skipped_date is not None and not conditional:
+            set_fetch_state(db, 'crude_oil_skipped_date', '')
+            commit_required = True
+        last_primary_date = db.session.query(
+            sqlalchemy.func.max(CrudeOilBarrelUSD.date)
+        ).scalar()
+        if last_primary_date is not None:
+            fallback_crude_data = {  # no use storing fallback data primary source already covers
+                date_key: rate for date_key, rate in fallback_crude_data.items()
+                if last_primary_date < date_key
+            }
+        if len(store_dated_values(db, CrudeOilBarrelUSDfb, 'rate', fallback_crude_data)) > 0:
+            commit_required = True
+        if reconcile_crude_oil_fallback(db, logger=logger) > 0:
+            commit_required = True
+        if commit_required:
+            db.session.commit()
     if logger is not None:
         logger.info('Finished fetching crude oil rate history.')
 
 
+def reconcile_crude_oil_fallback(db, logger=None):
+    '''
+    Deletes fallback crude oil records for dates the primary crude oil source covers, that is up
+    to and including the date of the last primary record. Doesn't commit.
+
+    Returns count of records deleted.
+    '''
+    last_primary_date = db.session.query(sqlalchemy.func.max(CrudeOilBarrelUSD.date)).scalar()
+    if last_primary_date is None:
+        return 0
+    deleted_count = db.session.query(CrudeOilBarrelUSDfb).filter(
+        CrudeOilBarrelUSDfb.date <= last_primary_date
+    ).delete(synchronize_session=False)
+    if logger is not None and deleted_count > 0:
+        logger.info('Removed %s fallback crude oil records superseded by primary source.' % (
+            deleted_count,
+        ))
+    return deleted_count
+
+
 def fetch_isk_rate_history(db, logger=None):
     if logger is None:
         logger = Logger
     today = datetime.datetime.now()
-    last_record = db.session.query(ExchangeRateOfISK).order_by(
-        ExchangeRateOfISK.date.desc()
-    ).first()
-    start_date = datetime.datetime(1981, 1, 1)
-    if last_record is not None:
-        yesterday = today - datetime.timedelta(days=1)
-        if yesterday.strftime('%Y-%m-%d') == last_record.date:
-            if logger is not None:
-                logger.info('We already have ISK rate history up to yesterday date.')
-                return  # no need to run scraper if we have data up to yesterday date
     if logger is not None:
         logger.info('Fetching ISK rate history ..')
-    if last_record is not None:
+    dates = plan_isk_rate_fetch(db, datetime.datetime(1981, 1, 1), today, logger=logger)
+    if len(dates) == 0:
         if logger is not None:
-            logger.info(
-                'We have ISK rate data up to "%s", querying data from that date to today ..' % (
-                    last_record.date,
-                )
-            )
-        start_date = datetime.datetime.strptime(last_record.date, '%Y-%m-%d')
-    if last_record is not None:
-        start_date = datetime.datetime.strptime(last_record.date, '%Y-%m-%d')
-    i_date = start_date
-    while i_date.strftime('%Y-%m-%d') < today.strftime('%Y-%m-%d'):
-        isk_data = endpoints.get_isk_exchange_rate(i_date, logger=logger)
+            logger.info('We already have complete ISK rate history up to yesterday date.')
+        return  # no need to run scraper if no dates are missing
+    currency_ids = get_currency_ids(db)
+    isk_data_generator = endpoints.get_isk_exchange_rates(dates, logger=logger)
+    for i_date, isk_data in zip(dates, isk_data_generator):
         assert(isk_data['date'] == i_date.strftime('%Y-%m-%d'))
-        commit_required = False
-        logger_messages = []
-        for curr_key in isk_data['currencies']:
-            curr = isk_data['currencies'][curr_key]
-            currency = db.session.query(Currency).filter_by(code=curr['code']).first()
-            if currency is None:
-                currency = Currency(name=curr['name'], code=curr['code'])
-                db.session.add(currency)
-                db.session.commit()
-            record = db.session.query(ExchangeRateOfISK).filter_by(
-                fk_currency=currency.currency_id,
-                date=isk_data['date']
-            ).first()
+        store_isk_rate_data(db, [isk_data], currency_ids=currency_ids, logger=logger)
+    if logger is not None:
+        logger.info('Finished fetching ISK rate history.')
+
+
+def plan_isk_rate_fetch(db, start_date, end_date, logger=None):
+    '''
+    Finds the business days from @start_date up to but not including @end_date for which ISK rate
+    data is missing, using a single set based query over the whole range.
+
+    A date is missing if no currency has a record for it, which covers the beginning of history,
+    days since last fetch and holes in the middle of the history. A currency lacking a record on
+    a date other currencies have records for is not a gap, rates for all currencies are fetched
+    and stored together so fetching that date again would return the same page.
+    '''
+    if logger is None:
+        logger = Logger
+    rows = db.session.execute(isk_rate_gaps_statement(), {
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'end_date': end_date.strftime('%Y-%m-%d')
+    })
+    dates_str = set()
+    for date_str, in rows:
+        date = datetime.datetime.strptime(date_str, '%Y-%m-%d')
+        if not icelandic_holidays.is_icelandic_business_day(date):
+            continue
+        dates_str.add(date_str)
+    if logger is not None:
+        logger.info('Planned ISK rate fetch for %s missing dates.' % (len(dates_str), ))
+    return [datetime.datetime.strptime(date_str, '%Y-%m-%d') for date_str in sorted(dates_str)]
+
+
+def isk_rate_gaps_statement():
+    '''
+    Returns ISK_RATE_GAPS_QUERY as text statement taking and returning dates as 'YYYY-MM-DD'
+    strings, they're epoch day integers in the query itself.
+    '''
+    return sqlalchemy.text(ISK_RATE_GAPS_QUERY).bindparams(
+        sqlalchemy.bindparam('start_date', type_=EpochDay()),
+        sqlalchemy.bindparam('end_date', type_=EpochDay())
+    ).columns(
+        sqlalchemy.column('date', EpochDay())
+    )
+
+
+def get_currency_ids(db):
+    '''
+    Returns dict mapping currency codes to currency ids, used as in-memory cache of the currency
+    table for the duration of a run.
+    '''
+    return {code: currency_id for currency_id, code in db.session.query(
+        Currency.currency_id,
+        Currency.code
+    )}
+
+
+def get_or_add_currency_id(db, currency_ids, code, name, logger=None):
+    '''
+    Returns currency id for @code from @currency_ids (see get_currency_ids), adding the currency
+    to database (flushed, not committed) and to @currency_ids if it's new.
+    '''
+    if code not in currency_ids:
+        currency = Currency(name=name, code=code)
+        db.session.add(currency)
+        db.session.flush()  # to get currency_id, committed along with the rates
+        currency_ids[code] = currency.currency_id
+        if logger is not None:
+            logger.info('Currency %s added.' % (code, ))
+    return currency_ids[code]
+
+
+def store_isk_rate_data(db, isk_data_list, currency_ids=None, logger=None):
+    '''
+    Writes ISK rate data, as returned by endpoints.get_isk_exchange_rate, to database. Records
+    already in database are left untouched, new records are written with a single INSERT OR IGNORE
+    statement and a single commit. Holidays revealed by sedlabanki.is are stored in the bank
+    holiday table so they aren't queried again.
+
+    @currency_ids is optional, the currency cache (see get_currency_ids) to use, pass the same
+    dict for every batch in a run to avoid querying the currency table per batch.
+    '''
+    with db.write_lock:  # serialized with other writers when fetch stages run concurrently
+        _store_isk_rate_data(db, isk_data_list, currency_ids=currency_ids, logger=logger)
+
+
+def _store_isk_rate_data(db, isk_data_list, currency_ids=None, logger=None):
+    if logger is None:
+        logger = Logger
+    if currency_ids is None:
+        currency_ids = get_currency_ids(db)
+    commit_required = False
+    logger_messages = []
+    dates = [isk_data['date'] for isk_data in isk_data_list if isk_data['status']['success']]
+    existing_keys = set()
+    if len(dates) > 0:
+        existing_keys = set(db.session.query(
+            ExchangeRateOfISK.fk_currency,
+            ExchangeRateOfISK.date
+        ).filter(
+            min(dates) <= ExchangeRateOfISK.date
+        ).filter(
+            ExchangeRateOfISK.date <= max(dates)
+        ))
+    rows = []
+    for isk_data in isk_data_list:
+        if isk_data['status']['holiday']:
+            if icelandic_holidays.get_icelandic_bank_holiday(
+                datetime.datetime.strptime(isk_data['date'], '%Y-%m-%d')
+            ) is not None:
+                continue  # already in precomputed holiday calendar
+            record = db.session.query(BankHoliday).filter_by(date=isk_data['date']).first()
             if record is None:
-                record = ExchangeRateOfISK(
-                    fk_currency=currency.currency_id,
-                    date=isk_data['date'],
-                    buy=curr['buy'],
-                    sell=curr['sell'],
-                    mean=curr['mean']
-                )
+                record = BankHoliday(date=isk_data['date'], description=isk_data['status']['msg'])
                 db.session.add(record)
-                logger_messages.append('Data "%s" %s [%s, %s, %s] written to database.' % (
-                    record.date,
-                    currency.code,
-                    record.buy,
-                    record.sell,
-                    record.mean
-                ))
+                logger_messages.append('Holiday "%s" written to database.' % (record.date, ))
                 commit_required = True
-        if commit_required:
-            db.session.commit()  # single commit for all currencies, better for disk drive
+            continue
+        if not isk_data['status']['success']:
+            continue  # no rates shown, the date is planned again on next run
+        for curr_key in isk_data['currencies']:
+            curr = isk_data['currencies'][curr_key]
+            currency_id = get_or_add_currency_id(
+                db,
+                currency_ids,
+                curr['code'],
+                curr['name'],
+                logger=logger
+            )
+            if (currency_id, isk_data['date']) in existing_keys:
+                continue
+            existing_keys.add((currency_id, isk_data['date']))
+            rows.append({
+                'fk_currency': currency_id,
+                'date': isk_data['date'],
+                'buy': curr['buy'] or 0.0,
+                'sell': curr['sell'] or 0.0,
+                'mean': curr['mean'] or 0.0
+            })
+            logger_messages.append('Data "%s" %s [%s, %s, %s] written to database.' % (
+                isk_data['date'],
+                curr['code'],
+                curr['buy'],
+                curr['sell'],
+                curr['mean']
+            ))
+    if len(rows) > 0:
+        db.insert_or_ignore(ExchangeRateOfISK, rows)  # executemany
+        commit_required = True
+    if commit_required or db.session.new:
+        db.session.commit()  # single commit for all currencies, better for disk drive
+    if logger is not None:
+        for message in logger_messages:
+            logger.info(message)
+
+
+def backfill_isk_rate_history(db, workers=4, requests_per_second=2.0, batch_size=50,
+                              logger=None):
+    '''
+    Backfill mode for fetch_isk_rate_history, runs @workers date workers in a thread pool. The
+    workers share a per host token bucket allowing @requests_per_second requests in total towards
+    sedlabanki.is. Each worker fetches a chunk of @batch_size dates over one connection, and the
+    calling thread acts as the single database writer, writing one batch per finished chunk.
+    '''
+    if logger is None:
+        logger = Logger
+    today = datetime.datetime.now()
+    dates = plan_isk_rate_fetch(db, datetime.datetime(1981, 1, 1), today, logger=logger)
+    if logger is not None:
+        logger.info('Backfilling ISK rate history for %s dates using %s workers ..' % (
+            len(dates),
+            workers
+        ))
+    rate_limiter = endpoints.get_rate_limiter(
+        endpoints.ISK_EXCHANGE_RATE_URL,
+        rate=requests_per_second
+    )
+
+    def fetch_dates(dates_chunk):
+        # each worker reuses one session and form state for its whole chunk of dates
+        return list(endpoints.get_isk_exchange_rates(
+            dates_chunk,
+            logger=logger,
+            rate_limiter=rate_limiter
+        ))
+
+    currency_ids = get_currency_ids(db)
+    dates_chunks = [dates[i:i + batch_size] for i in range(0, len(dates), batch_size)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch_dates, dates_chunk) for dates_chunk in dates_chunks]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                store_isk_rate_data(
+                    db,
+                    future.result(),
+                    currency_ids=currency_ids,
+                    logger=logger
+                )
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    if logger is not None:
+        logger.info('Finished backfilling ISK rate history.')
+
+
+def import_isk_rate_history_from_export(db, source, batch_size=5000, logger=None):
+    '''
+    Imports ISK rate history from a multi-day Central Bank of Iceland export file (see
+    endpoints.get_isk_exchange_rate_export) into database, in one transaction. Records already in
+    database are left untouched.
+    '''
+    if logger is None:
+        logger = Logger
+    currency_ids = get_currency_ids(db)
+    existing_keys = set(db.session.query(ExchangeRateOfISK.fk_currency, ExchangeRateOfISK.date))
+    batch = []
+    records_count = 0
+    try:
+        for row in endpoints.get_isk_exchange_rate_export(source, logger=logger):
+            currency_id = get_or_add_currency_id(
+                db,
+                currency_ids,
+                row['code'],
+                row['name'] or row['code'],
+                logger=logger
+            )
+            key = (currency_id, row['date'])
+            if key in existing_keys:
+                continue
+            existing_keys.add(key)
+            batch.append({
+                'fk_currency': currency_id,
+                'date': row['date'],
+                'buy': row['buy'] or 0.0,
+                'sell': row['sell'] or 0.0,
+                'mean': row['mean'] or 0.0
+            })
+            if len(batch) >= batch_size:
+                db.insert_or_ignore(ExchangeRateOfISK, batch)  # executemany
+                records_count += len(batch)
+                batch = []
+        if len(batch) > 0:
+            db.insert_or_ignore(ExchangeRateOfISK, batch)
+            records_count += len(batch)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    if logger is not None:
+        logger.info('Imported %s ISK rate records from export.' % (records_count, ))
+
+
+def import_crude_oil_rate_history_from_eia_bulk(db, source=None, batch_size=5000, logger=None):
+    '''
+    Imports crude oil rate history from the EIA bulk petroleum file (see
+    endpoints.get_crude_oil_rate_history_eia_bulk) into database, in one transaction. Records
+    already in database are left untouched.
+    '''
+    if logger is None:
+        logger = Logger
+    batch = {}
+    records_count = 0
+    try:
+        for date_key, rate in endpoints.get_crude_oil_rate_history_eia_bulk(source, logger=logger):
+            batch[date_key] = rate
+            if len(batch) >= batch_size:
+                records_count += len(store_dated_values(db, CrudeOilBarrelUSD, 'rate', batch))
+                batch = {}
+        records_count += len(store_dated_values(db, CrudeOilBarrelUSD, 'rate', batch))
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    if logger is not None:
+        logger.info('Imported %s crude oil rate records from EIA bulk file.' % (records_count, ))
+
+
+def load_database_from_csv_files(db, data_directory='data', logger=None):
+    '''
+    Loads ISK rate, crude oil rate and fuel price history from the CSV data files written by
+    --write-data into an empty database, in one transaction, so a run can fetch only what's new
+    without a persistent database.
+
+    The data files don't contain everything the database does, so some of it is reconstructed:
+    currency names are set to the currency codes, business days within the ISK rate history
+    without any rates are stored as bank holidays, crude oil rates of the last
+    CSV_CRUDE_OIL_FALLBACK_DAYS days are stored as fallback records and FÍB data is marked frozen
+    if present.
+    '''
+    if logger is None:
+        logger = Logger
+    try:
+        # ISK rates
+        currency_files = {}
+        for filename in sorted(glob.glob(
+            os.path.join(data_directory, 'currency_rate_isk_*.csv.txt')
+        )):
+            currency_code = os.path.basename(filename)[len('currency_rate_isk_'):-len('.csv.txt')]
+            currency_files[currency_code.upper()] = filename
+        currency_ids = get_currency_ids(db)
+        for currency_code in currency_files:
+            get_or_add_currency_id(db, currency_ids, currency_code, currency_code, logger=logger)
+        isk_rate_dates = set()
+        for currency_code, filename in currency_files.items():
+            rows = []
+            with open(filename, mode='r', encoding='utf-8') as isk_file:
+                for line in csv.DictReader(isk_file):
+                    rows.append({
+                        'fk_currency': currency_ids[currency_code],
+                        'date': line['date'],
+                        'buy': float(line['buy'] or 0.0),
+                        'sell': float(line['sell'] or 0.0),
+                        'mean': float(line['mean'] or 0.0)
+                    })
+                    isk_rate_dates.add(line['date'])
+            db.insert_or_ignore(ExchangeRateOfISK, rows)  # executemany
+            if logger is not None:
+                logger.info('Loaded %s ISK rate records from "%s".' % (len(rows), filename))
+        # business days without rates are holidays learned from sedlabanki.is
+        holiday_rows = []
+        if len(isk_rate_dates) > 0:
+            current_date = datetime.datetime.strptime(min(isk_rate_dates), '%Y-%m-%d')
+            last_date = datetime.datetime.strptime(max(isk_rate_dates), '%Y-%m-%d')
+            while current_date < last_date:
+                date_str = current_date.strftime('%Y-%m-%d')
+                if (date_str not in isk_rate_dates and
+                        icelandic_holidays.is_icelandic_business_day(current_date)):
+                    holiday_rows.append({
+                        'date': date_str,
+                        'description': 'No currency rates registered on "%s".' % (date_str, )
+                    })
+                current_date += datetime.timedelta(days=1)
+        db.insert_or_ignore(BankHoliday, holiday_rows)
+        # crude oil rates
+        filename = os.path.join(data_directory, 'crude_oil_barrel_usd.csv.txt')
+        with open(filename, mode='r', encoding='utf-8') as crude_oil_file:
+            crude_oil_data = {line['date']: float(line['price']) for line in csv.DictReader(
+                crude_oil_file
+            )}
+        fallback_crude_oil_data = {}
+        if len(crude_oil_data) > 0:
+            fallback_date = datetime.datetime.strptime(max(crude_oil_data), '%Y-%m-%d')
+            fallback_date -= datetime.timedelta(days=CSV_CRUDE_OIL_FALLBACK_DAYS)
+            fallback_date_str = fallback_date.strftime('%Y-%m-%d')
+            fallback_crude_oil_data = {
+                date_key: rate for date_key, rate in crude_oil_data.items()
+                if fallback_date_str < date_key
+            }
+            crude_oil_data = {
+                date_key: rate for date_key, rate in crude_oil_data.items()
+                if date_key <= fallback_date_str
+            }
+        store_dated_values(db, CrudeOilBarrelUSD, 'rate', crude_oil_data)
+        store_dated_values(db, CrudeOilBarrelUSDfb, 'rate', fallback_crude_oil_data)
         if logger is not None:
-            for message in logger_messages:
-                logger.info(message)
-        i_date += datetime.timedelta(days=1)
+            logger.info('Loaded %s crude oil rate records (%s fallback) from "%s".' % (
+                len(crude_oil_data) + len(fallback_crude_oil_data),
+                len(fallback_crude_oil_data),
+                filename
+            ))
+        # fuel prices
+        for model, filename in (
+            (PetrolPriceIcelandLiterISK, 'fuel_petrol_iceland_liter_isk.csv.txt'),
+            (DieselPriceIcelandLiterISK, 'fuel_diesel_iceland_liter_isk.csv.txt')
+        ):
+            filename = os.path.join(data_directory, filename)
+            with open(filename, mode='r', encoding='utf-8') as fuel_file:
+                fuel_price_data = {line['date']: float(line['price']) for line in csv.DictReader(
+                    fuel_file
+                )}
+            store_dated_values(db, model, 'price', fuel_price_data)
+            if logger is not None:
+                logger.info('Loaded %s fuel price records from "%s".' % (
+                    len(fuel_price_data),
+                    filename
+                ))
+        if get_fib_last_prices(db) is not None:
+            set_fetch_state(db, 'fib_segment_frozen', datetime.datetime.utcnow().isoformat())
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
     if logger is not None:
-        logger.info('Finished fetching ISK rate history.')
+        logger.info('Finished loading database from CSV data files.')
 
 
-def fetch_isk_inflation_index_history_and_write_to_file(logger=None):
+def rebuild_database_from_csv_files(db, db_filename, data_directory='data', logger=None):
+    '''
+    Builds a new database file from the CSV data files (see load_database_from_csv_files) and
+    replaces @db_filename with it, instead of scraping the whole history again.
+
+    The new database is written to a temporary file next to @db_filename with journal and fsync
+    turned off, the rows are inserted with executemany in a single transaction and secondary
+    indexes are only created once the tables are filled. The temporary file is renamed over
+    @db_filename when done, so readers see either the old or the new database. Leaves @db set up
+    with the new database.
+    '''
+    if logger is None:
+        logger = Logger
+    start = time.time()
+    tmp_db_filename = '%s.rebuild.tmp' % (db_filename, )
+    if os.path.exists(tmp_db_filename):
+        os.remove(tmp_db_filename)
+    if logger is not None:
+        logger.info('Rebuilding database "%s" from CSV data files ..' % (db_filename, ))
+    try:
+        db.setup_connection('sqlite:///%s' % (tmp_db_filename, ))
+        # the temporary file is thrown away if we fail, no use journaling or syncing it
+        database.db.set_sqlite_pragmas(db.engine, {'journal_mode': 'OFF', 'synchronous': 'OFF'})
+        db.init_db()
+        indexes = [index for table in db.Base.metadata.sorted_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(bind=db.engine)
+        load_database_from_csv_files(db, data_directory=data_directory, logger=logger)
+        for index in indexes:
+            index.create(bind=db.engine)
+        db.session.remove()
+        db.engine.dispose()
+    except BaseException:
+        if os.path.exists(tmp_db_filename):
+            os.remove(tmp_db_filename)
+        raise
+    # a write-ahead log left by the old database would be applied to the new one
+    for suffix in ('-wal', '-shm', '-journal'):
+        if os.path.exists(db_filename + suffix):
+            os.remove(db_filename + suffix)
+    os.replace(tmp_db_filename, db_filename)
+    db.setup_connection('sqlite:///%s' % (db_filename, ))
+    if logger is not None:
+        logger.info('Rebuilt database "%s" in %.1f seconds.' % (db_filename, time.time() - start))
+
+
+def fetch_isk_inflation_index_history_and_write_to_file(logger=None, revision_check_months=12):
+    '''
+    Fetches ISK inflation index history and writes it to data file.
+
+    If the data file exists only the months after the last month in it are queried, along with
+    the @revision_check_months months before, and new months are appended to the file. If values
+    for those overlapping months differ from the file (Hagstofa revised history) the whole series
+    is downloaded and the file rewritten.
+    '''
     if logger is None:
         logger = Logger
-    isk_inflation_index_data = endpoints.get_isk_inflation_index_history(logger=logger)
     filename = 'data/currency_isk_inflation_index.csv.txt'
+    stored_months = []
+    if os.path.exists(filename):
+        with open(filename, mode='r', encoding='utf-8') as infile:
+            stored_months = [(row['date'], row['value']) for row in csv.DictReader(infile)]
+    if len(stored_months) > 0:
+        last_stored_date = datetime.datetime.strptime(stored_months[-1][0], '%Y-%m-%d')
+        today = datetime.datetime.utcnow()
+        new_months_count = (
+            (today.year - last_stored_date.year) * 12 + today.month - last_stored_date.month - 1
+        )
+        if new_months_count <= 0:
+            if logger is not None:
+                logger.info('ISK inflation index data file already up to last month.')
+            return
+        isk_inflation_index_data = endpoints.get_isk_inflation_index_history(
+            logger=logger,
+            last_months=new_months_count + revision_check_months
+        )
+        if isk_inflation_index_data is endpoints.NOT_MODIFIED:
+            return  # data file already up to date
+        fetched_months = [
+            (month['date'], month['value']) for month in isk_inflation_index_data['list']
+        ]
+        overlap = [month for month in fetched_months if month[0] <= stored_months[-1][0]]
+        if overlap == stored_months[-len(overlap):] and len(overlap) > 0:
+            new_months = [month for month in fetched_months if month[0] > stored_months[-1][0]]
+            with open(filename, mode='a', encoding='utf-8') as outfile:
+                for date_str, value in new_months:
+                    outfile.write('%s,%s\n' % (date_str, value))
+            if logger is not None:
+                logger.info('Appended %s months to isk inflation index history data file.' % (
+                    len(new_months),
+                ))
+            return
+        if logger is not None:
+            logger.info('ISK inflation index history revised, fetching whole series ..')
+    isk_inflation_index_data = endpoints.get_isk_inflation_index_history(
+        logger=logger,
+        conditional=False  # file missing or revised, need the data either way
+    )
     with open(filename, mode='w', encoding='utf-8') as outfile:
         outfile.write('date,value\n')
         for month in isk_inflation_index_data['list']:
@@ -160,7 +713,83 @@ def fetch_isk_inflation_index_history_and_write_to_file(logger=None):
         logger.info('Finished writing isk inflation index history data to files.')
 
 
-def fetch_icelandic_fuel_price_history(db, logger=None):
+def get_fetch_state(db, key):
+    '''
+    Returns value stored for @key in fetch state table, or None.
+    '''
+    record = db.session.query(FetchState).filter_by(key=key).first()
+    if record is None:
+        return None
+    return record.value
+
+
+def set_fetch_state(db, key, value):
+    '''
+    Stores @value (str) for @key in fetch state table. Doesn't commit.
+    '''
+    record = db.session.query(FetchState).filter_by(key=key).first()
+    if record is None:
+        record = FetchState(key=key, value=value)
+        db.session.add(record)
+    else:
+        record.value = value
+
+
+def get_fib_last_prices(db):
+    '''
+    Returns dict with last stored FÍB petrol and diesel prices (before 2016-04-19, where Gasvaktin
+    data takes over), or None if we don't have FÍB data for both.
+    '''
+    prices = {}
+    for fuel_type, model in (
+        ('petrol', PetrolPriceIcelandLiterISK),
+        ('diesel', DieselPriceIcelandLiterISK)
+    ):
+        record = db.session.query(model).filter(
+            model.date < '2016-04-19'
+        ).order_by(model.date.desc()).first()
+        if record is None:
+            return None
+        prices[fuel_type] = record.price
+    return prices
+
+
+def pull_gasvaktin_repo(config, logger=None):
+    '''
+    Pulls the local gasvaktin repository (gasvaktin_git_directory in config), so Gasvaktin trends
+    data read from it is as new as the one on GitHub.
+    '''
+    if logger is None:
+        logger = Logger
+    gasvaktin_repo_path = os.path.expanduser(config.get('Comparison', 'gasvaktin_git_directory'))
+    git_ssh_identity_file = os.path.expanduser(config.get('Comparison', 'ssh_id_file'))
+    assert(os.path.exists(git_ssh_identity_file) and os.path.isfile(git_ssh_identity_file))
+    git_ssh_cmd = 'ssh -i %s' % (git_ssh_identity_file, )
+    if logger is not None:
+        logger.info('Pulling gasvaktin git repository ..')
+    repo = git.Repo(gasvaktin_repo_path)
+    with repo.git.custom_environment(GIT_SSH_COMMAND=git_ssh_cmd):
+        assert(repo.active_branch.name == 'master')
+        repo.git.pull()
+
+
+def fetch_icelandic_fuel_price_history(db, trends_source=None, gasvaktin_repo_path=None,
+                                       logger=None):
+    '''
+    Fetches icelandic fuel price history and stores new records in database.
+
+    @trends_source is optional, where to read Gasvaktin trends data from, 'github' (default) to
+    download it, 'worktree' to read it from the working tree of the local gasvaktin repository at
+    @gasvaktin_repo_path or otherwise a git revision in that repository to read it from. When read
+    from the local repository the git blob SHA is remembered, and if it's unchanged on next run
+    the trends data isn't parsed at all, unless days up to yesterday are left to calculate.
+
+    FÍB data, which ends where Gasvaktin data begins, is marked frozen in fetch state table once
+    stored and isn't fetched again.
+
+    Each company's last known change is kept in fetch state table along with the mean prices of
+    the last calculated day, so only changes after that day need to be applied on the next run.
+    '''
     if logger is None:
         logger = Logger
     start_date = None
@@ -176,37 +805,68 @@ def fetch_icelandic_fuel_price_history(db, logger=None):
         if (start_date is None or
                 start_date > datetime.datetime.strptime(last_petrol_record.date, '%Y-%m-%d')):
             start_date = datetime.datetime.strptime(last_petrol_record.date, '%Y-%m-%d')
-    fuel_price_data = endpoints.get_icelandic_fuel_price_history(start_date, logger)
-    commit_required = False
-    logger_messages = []
-    for date_key in fuel_price_data['petrol']:
-        record = db.session.query(PetrolPriceIcelandLiterISK).filter_by(date=date_key).first()
-        if record is None:
-            record = PetrolPriceIcelandLiterISK(
-                date=date_key,
-                price=fuel_price_data['petrol'][date_key]
-            )
-            db.session.add(record)
-            logger_messages.append('Petrol data "%s" %s written to database.' % (
-                date_key,
-                fuel_price_data['petrol'][date_key]
-            ))
+    gasvaktin_state = {}
+    if start_date is not None:  # state is only valid along with the fuel price data it produced
+        gasvaktin_state = json.loads(get_fetch_state(db, 'gasvaktin_mean_price_state') or '{}')
+    # days are calculated up to yesterday, so changes made today in unchanged trends data still
+    # need calculating on a later day
+    yesterday_str = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    calculated_up_to_yesterday = gasvaktin_state.get('date', '') >= yesterday_str
+    trends_data = None
+    if trends_source not in (None, 'github'):
+        assert(gasvaktin_repo_path is not None)
+        known_sha = None
+        if calculated_up_to_yesterday:  # nothing to skip if days are left to calculate
+            known_sha = get_fetch_state(db, 'gasvaktin_trends_blob_sha')
+        trends_data = endpoints.get_gasvaktin_trends_from_git(
+            gasvaktin_repo_path,
+            rev=None if trends_source == 'worktree' else trends_source,
+            known_sha=known_sha,
+            logger=logger
+        )
+        if trends_data is endpoints.NOT_MODIFIED:
+            return
+    fib_last_prices = None
+    if get_fetch_state(db, 'fib_segment_frozen') is not None:
+        fib_last_prices = get_fib_last_prices(db)
+    fuel_price_data = endpoints.get_icelandic_fuel_price_history(
+        start_date,
+        logger,
+        gasvaktin_trends_content=None if trends_data is None else trends_data['content'],
+        gasvaktin_state=gasvaktin_state,
+        fib_last_prices=fib_last_prices,
+        conditional=calculated_up_to_yesterday
+    )
+    if fuel_price_data is endpoints.NOT_MODIFIED:
+        return
+    with db.write_lock:  # serialized with other writers when fetch stages run concurrently
+        commit_required = False
+        logger_messages = []
+        for fuel_type, model in (
+            ('petrol', PetrolPriceIcelandLiterISK),
+            ('diesel', DieselPriceIcelandLiterISK)
+        ):
+            inserted = store_dated_values(db, model, 'price', fuel_price_data[fuel_type])
+            for date_key, price in inserted:
+                logger_messages.append('%s data "%s" %s written to database.' % (
+                    fuel_type.capitalize(),
+                    date_key,
+                    price
+                ))
+            if len(inserted) > 0:
+                commit_required = True
+        if trends_data is not None:
+            set_fetch_state(db, 'gasvaktin_trends_blob_sha', trends_data['sha'])
             commit_required = True
-    for date_key in fuel_price_data['diesel']:
-        record = db.session.query(DieselPriceIcelandLiterISK).filter_by(date=date_key).first()
-        if record is None:
-            record = DieselPriceIcelandLiterISK(
-                date=date_key,
-                price=fuel_price_data['diesel'][date_key]
-            )
-            db.session.add(record)
-            logger_messages.append('Petrol data "%s" %s written to database.' % (
-                date_key,
-                fuel_price_data['diesel'][date_key]
-            ))
+        if gasvaktin_state:
+            set_fetch_state(db, 'gasvaktin_mean_price_state', json.dumps(gasvaktin_state))
             commit_required = True
-    if commit_required:
-        db.session.commit()  # single commit for all currencies, better for disk drive
+        if fib_last_prices is None and get_fib_last_prices(db) is not None:
+            # FÍB data ends where Gasvaktin data begins, never changes once stored
+            set_fetch_state(db, 'fib_segment_frozen', datetime.datetime.utcnow().isoformat())
+            commit_required = True
+        if commit_required:
+            db.session.commit()  # single commit for all currencies, better for disk drive
     if logger is not None:
         for message in logger_messages:
             logger.info(message)
@@ -217,29 +877,25 @@ def write_crude_oil_rate_history_to_file(db, logger=None):
         logger = Logger
     if logger is not None:
         logger.info('Writing crude oil rate history data to files ..')
-    crude_oil_records = db.session.query(CrudeOilBarrelUSD).order_by(CrudeOilBarrelUSD.date)
+    # the merged series, primary source records followed by fallback source filler records for
+    # dates after the last primary record
+    crude_oil_records = db.session.execute(
+        sqlalchemy.select([
+            crude_oil_barrel_usd_merged.c.date,
+            crude_oil_barrel_usd_merged.c.rate
+        ]).order_by(crude_oil_barrel_usd_merged.c.date)
+    ).fetchall()
+    assert(len(crude_oil_records) > 0)
     # the plain crude oil data from the Federal Reserve Bank of St Louis
     filename1 = 'data/crude_oil_barrel_usd.csv.txt'
     with open(filename1, mode='w', encoding='utf-8') as crude_oil_file1:
         if logger is not None:
             logger.info('Writing to file "%s" ..' % (filename1, ))
         crude_oil_file1.write('date,price\n')
-        final_date = None
         for record in crude_oil_records:
-            final_date = record.date
             crude_oil_file1.write('%s,%s\n' % (record.date, record.rate))
-        # add filler data
-        if logger is not None:
-            logger.info('Adding crude oil filler data .. ')
-        assert(final_date is not None)
-        crude_oil_fallback_records = db.session.query(
-            CrudeOilBarrelUSDfb
-        ).filter(final_date < CrudeOilBarrelUSDfb.date).order_by(CrudeOilBarrelUSDfb.date)
-        for fallback_record in crude_oil_fallback_records:
-            crude_oil_file1.write('%s,%s\n' % (fallback_record.date, fallback_record.rate))
     us_dollar = db.session.query(Currency).filter_by(code='USD').first()
     assert(us_dollar is not None)
-    crude_oil_records = db.session.query(CrudeOilBarrelUSD).order_by(CrudeOilBarrelUSD.date)
     # the crude oil data converted to litres instead of barrels and ISK instead of USD (using
     # exchange rate for ISK from Central Bank of Iceland)
     bbl_to_litres = 158.987294928  # https://twitter.com/gasvaktin/status/993875638435090433
@@ -250,9 +906,7 @@ def write_crude_oil_rate_history_to_file(db, logger=None):
         if logger is not None:
             logger.info('Writing to file "%s" ..' % (filename2, ))
         crude_oil_file2.write('date,price\n')
-        final_date = None
         for crude_oil_record in crude_oil_records:
-            final_date = crude_oil_record.date
             isk_usd_rate = db.session.query(ExchangeRateOfISK).filter_by(
                 fk_currency=us_dollar.currency_id
             ).filter(
@@ -269,32 +923,6 @@ def write_crude_oil_rate_history_to_file(db, logger=None):
                 )
             price_per_liter_in_isk = round(price_per_liter_in_isk, 2)
             crude_oil_file2.write('%s,%s\n' % (crude_oil_record.date, price_per_liter_in_isk))
-        # add filler data
-        if logger is not None:
-            logger.info('Adding crude oil filler data .. ')
-        assert(final_date is not None)
-        crude_oil_fallback_records = db.session.query(
-            CrudeOilBarrelUSDfb
-        ).filter(final_date < CrudeOilBarrelUSDfb.date).order_by(CrudeOilBarrelUSDfb.date)
-        for crude_oil_fallback_record in crude_oil_fallback_records:
-            isk_usd_rate = db.session.query(ExchangeRateOfISK).filter_by(
-                fk_currency=us_dollar.currency_id
-            ).filter(
-                ExchangeRateOfISK.date <= crude_oil_fallback_record.date
-            ).order_by(ExchangeRateOfISK.date.desc()).first()
-            assert(isk_usd_rate is not None)
-            if isk_usd_rate.sell != 0.0:
-                price_per_liter_in_isk = (
-                    crude_oil_fallback_record.rate * isk_usd_rate.sell / bbl_to_litres
-                )
-            else:
-                price_per_liter_in_isk = (
-                    crude_oil_fallback_record.rate * isk_usd_rate.mean / bbl_to_litres
-                )
-            price_per_liter_in_isk = round(price_per_liter_in_isk, 2)
-            crude_oil_file2.write(
-                '%s,%s\n' % (crude_oil_fallback_record.date, price_per_liter_in_isk)
-            )
     if logger is not None:
         logger.info('Finished writing crude oil rate history data to files.')
 
@@ -813,6 +1441,169 @@ def commit_changes_to_git(db, config, logger=None):
                 logger.info('Repository is clean.')
 
 
+def get_hot_queries(db):
+    '''
+    Returns list of (description, statement, allowed_scans, required_indexes) tuples for the
+    queries run on every fetch or write, built the same way as in the functions named in the
+    descriptions, with sample parameters. @allowed_scans is a set of tables the query is meant to
+    scan, either reading the whole table or stopping at the first row in index order.
+    @required_indexes is a set of indexes the query plan has to use, for lookups SQLite reports
+    as searches even without an index fit for them (like MIN() of a column not leading any
+    index).
+    '''
+    date_a, date_b = '2020-01-01', '2020-01-31'
+    hot_queries = [
+        (
+            'plan_isk_rate_fetch: ISK rate gaps',
+            isk_rate_gaps_statement().bindparams(start_date=date_a, end_date=date_b),
+            set(),
+            {'ix_exchange_rate_of_isk_date'}
+        ),
+        (
+            'store_isk_rate_data: existing ISK rates in date range',
+            db.session.query(ExchangeRateOfISK.fk_currency, ExchangeRateOfISK.date).filter(
+                date_a <= ExchangeRateOfISK.date
+            ).filter(ExchangeRateOfISK.date <= date_b).statement,
+            set(),
+            {'ix_exchange_rate_of_isk_date'}
+        ),
+        (
+            'store_isk_rate_data: learned bank holiday',
+            db.session.query(BankHoliday).filter_by(date=date_a).limit(1).statement,
+            set(),
+            set()
+        ),
+        (
+            'get_fetch_state: fetch state by key',
+            db.session.query(FetchState).filter_by(key='fib_segment_frozen').limit(1).statement,
+            set(),
+            set()
+        ),
+        (
+            'fetch_crude_oil_rate_history: last crude oil record',
+            db.session.query(CrudeOilBarrelUSD).order_by(
+                CrudeOilBarrelUSD.date.desc()
+            ).limit(1).statement,
+            {'crude_oil_barrel_usd'},
+            set()
+        ),
+        (
+            'reconcile_crude_oil_fallback: last primary crude oil date',
+            db.session.query(sqlalchemy.func.max(CrudeOilBarrelUSD.date)).statement,
+            set(),
+            set()
+        ),
+        (
+            'reconcile_crude_oil_fallback: superseded fallback crude oil records',
+            sqlalchemy.delete(CrudeOilBarrelUSDfb).where(CrudeOilBarrelUSDfb.date <= date_b),
+            set(),
+            set()
+        ),
+        (
+            'write_crude_oil_rate_history_to_file: merged crude oil series',
+            sqlalchemy.select([
+                crude_oil_barrel_usd_merged.c.date,
+                crude_oil_barrel_usd_merged.c.rate
+            ]).order_by(crude_oil_barrel_usd_merged.c.date),
+            {'crude_oil_barrel_usd'},
+            set()
+        ),
+        (
+            'write_crude_oil_rate_history_to_file: ISK rate as of date',
+            db.session.query(ExchangeRateOfISK).filter_by(fk_currency=1).filter(
+                ExchangeRateOfISK.date <= date_b
+            ).order_by(ExchangeRateOfISK.date.desc()).limit(1).statement,
+            set(),
+            set()
+        ),
+        (
+            'write_isk_rate_history_to_files: ISK rates of currency',
+            db.session.query(ExchangeRateOfISK).filter_by(fk_currency=1).order_by(
+                ExchangeRateOfISK.date
+            ).statement,
+            set(),
+            set()
+        )
+    ]
+    for model in (
+        CrudeOilBarrelUSD,
+        CrudeOilBarrelUSDfb,
+        PetrolPriceIcelandLiterISK,
+        DieselPriceIcelandLiterISK
+    ):
+        hot_queries.append((
+            'store_dated_values: existing %s dates in range' % (model.__tablename__, ),
+            db.session.query(model.date).filter(date_a <= model.date).filter(
+                model.date <= date_b
+            ).statement,
+            set(),
+            set()
+        ))
+    for model in (PetrolPriceIcelandLiterISK, DieselPriceIcelandLiterISK):
+        hot_queries.append((
+            'fetch_icelandic_fuel_price_history: last %s record' % (model.__tablename__, ),
+            db.session.query(model).order_by(model.date.desc()).limit(1).statement,
+            {model.__tablename__},
+            set()
+        ))
+        hot_queries.append((
+            'get_fib_last_prices: last FIB %s record' % (model.__tablename__, ),
+            db.session.query(model).filter(model.date < '2016-04-19').order_by(
+                model.date.desc()
+            ).limit(1).statement,
+            set(),
+            set()
+        ))
+    return hot_queries
+
+
+def explain_query_plan(db, statement):
+    '''
+    Returns list of the detail lines of SQLite's EXPLAIN QUERY PLAN for @statement.
+    '''
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN %s' % (compiled, ))
+    return [row[3] for row in rows]
+
+
+def check_query_plans(db, logger=None):
+    '''
+    Checks the query plans of the hot queries (see get_hot_queries) for full scans of tables,
+    so schema changes dropping an index the queries rely on don't go unnoticed.
+
+    Returns list of failure messages, empty if all query plans use indexes.
+    '''
+    if logger is None:
+        logger = Logger
+    tables = set(database.db.Base.metadata.tables.keys())
+    failures = []
+    for description, statement, allowed_scans, required_indexes in get_hot_queries(db):
+        scanned_tables = []
+        used_indexes = set()
+        for detail in explain_query_plan(db, statement):
+            # e.g. "SCAN exchange_rate_of_isk USING COVERING INDEX ..", "SCAN TABLE currency"
+            match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+            if match is not None and match.group(1) in tables:
+                scanned_tables.append(match.group(1))
+            match = re.search(r'USING (?:COVERING )?INDEX (\w+)', detail)
+            if match is not None:
+                used_indexes.add(match.group(1))
+        failure_count = len(failures)
+        unexpected_scans = [table for table in scanned_tables if table not in allowed_scans]
+        if len(unexpected_scans) > 0:
+            failures.append('%s: full scan of %s.' % (description, ', '.join(unexpected_scans)))
+        unused_indexes = sorted(required_indexes - used_indexes)
+        if len(unused_indexes) > 0:
+            failures.append('%s: index %s not used.' % (description, ', '.join(unused_indexes)))
+        if len(failures) > failure_count:
+            if logger is not None:
+                for failure in failures[failure_count:]:
+                    logger.error(failure)
+        elif logger is not None:
+            logger.info('%s: OK.' % (description, ))
+    return failures
+
+
 def main(init_logger=True):
     global Logger
     if init_logger:
@@ -829,6 +1620,49 @@ def main(init_logger=True):
     parser.add_argument('-f', '--fetch-data', action='store_true', help=(
         'Fetch additional data if available and store in local database.'
     ))
+    parser.add_argument('-p', '--parallel-fetch', action='store_true', help=(
+        'Run the independent fetch stages (crude oil, ISK rates, fuel prices, inflation index) '
+        'concurrently (used with --fetch-data).'
+    ))
+    parser.add_argument('-b', '--backfill-workers', type=int, default=None, help=(
+        'Fetch ISK rate history in backfill mode, using given number of parallel date workers '
+        '(used with --fetch-data).'
+    ))
+    parser.add_argument('--backfill-rate', type=float, default=2.0, help=(
+        'Total requests per second allowed towards sedlabanki.is in backfill mode (default: 2.0).'
+    ))
+    parser.add_argument('-i', '--import-isk-rates', default=None, metavar='SOURCE', help=(
+        'Import ISK rate history from a multi-day Central Bank of Iceland export file, SOURCE is '
+        'a path to a CSV or XML file or an URL to one.'
+    ))
+    parser.add_argument(
+        '--import-eia-bulk', default=None, metavar='SOURCE', nargs='?', const='', help=(
+            'Import crude oil rate history from the EIA bulk petroleum file PET.zip, SOURCE is a '
+            'path to a local copy or an URL to one, downloaded from eia.gov if omitted.'
+        )
+    )
+    parser.add_argument('--trends-source', default='github', metavar='SOURCE', help=(
+        'Where to read Gasvaktin trends data from, "github" (default) to download it, "worktree" '
+        'to read it from the local gasvaktin repository (gasvaktin_git_directory in config) or a '
+        'git revision in that repository to read it from, the repository is pulled first.'
+    ))
+    parser.add_argument('--rebuild-db-from-csv', action='store_true', help=(
+        'Replace the database file with one built from the CSV data files, instead of fetching '
+        'the whole history again.'
+    ))
+    parser.add_argument('--check-query-plans', action='store_true', help=(
+        'Check that the queries run on every fetch and write use indexes instead of full table '
+        'scans, fails if any does.'
+    ))
+    parser.add_argument('--migrate-db', action='store_true', help=(
+        'Convert date columns of a database stored as text to integer epoch days, required once '
+        'for databases created before dates were stored as integers.'
+    ))
+    parser.add_argument('-m', '--in-memory', action='store_true', help=(
+        'Use an in-memory database loaded from the CSV data files instead of the database file, '
+        'use with --fetch-data and --write-data to update the data files without a persistent '
+        'database.'
+    ))
     parser.add_argument('-w', '--write-data', action='store_true', help=(
         'Write collected data to plain CSV data files.'
     ))
@@ -850,22 +1684,94 @@ def main(init_logger=True):
                 pargs.config,
             ))
         config.read(default_config_file)
+    http_cache_directory = config.get('Comparison', 'http_cache_directory', fallback=None)
+    if http_cache_directory:
+        endpoints.set_http_cache(os.path.expanduser(http_cache_directory))
     if Logger is not None:
         Logger.info('Initiating database ..')
-    db_uri = 'sqlite:///database/database.sqlite'
+    db_filename = 'database/database.sqlite'
+    db_uri = 'sqlite:///%s' % (db_filename, )
+    if pargs.rebuild_db_from_csv:
+        assert(not pargs.in_memory)
+        if Logger is not None:
+            Logger.info('Running --rebuild-db-from-csv ..')
+        rebuild_database_from_csv_files(database.db, db_filename)
+    if pargs.in_memory:
+        db_uri = 'sqlite://'
     db_init = True
-    database.db.setup_connection(db_uri)
+    sqlite_profile = config.get('Comparison', 'sqlite_profile', fallback=None)
+    database.db.setup_connection(db_uri, sqlite_profile=sqlite_profile or None)
+    if pargs.migrate_db:
+        if Logger is not None:
+            Logger.info('Running --migrate-db ..')
+        database.db.migrate_date_columns(logger=Logger)
     if db_init:
         database.db.init_db()
+    if pargs.in_memory:
+        load_database_from_csv_files(database.db)
     if Logger is not None:
         Logger.info('.. database initialized.')
+    if pargs.check_query_plans:
+        if Logger is not None:
+            Logger.info('Running --check-query-plans ..')
+        failures = check_query_plans(database.db)
+        if len(failures) > 0:
+            raise Exception('%s hot queries scan tables:\n%s' % (
+                len(failures),
+                '\n'.join(failures)
+            ))
+    if pargs.import_isk_rates is not None:
+        if Logger is not None:
+            Logger.info('Running --import-isk-rates ..')
+        import_isk_rate_history_from_export(database.db, pargs.import_isk_rates)
+    if pargs.import_eia_bulk is not None:
+        if Logger is not None:
+            Logger.info('Running --import-eia-bulk ..')
+        import_crude_oil_rate_history_from_eia_bulk(database.db, pargs.import_eia_bulk or None)
     if pargs.fetch_data:
         if Logger is not None:
             Logger.info('Running --fetch-data ..')
-        fetch_crude_oil_rate_history(database.db)
-        fetch_isk_rate_history(database.db)
-        fetch_icelandic_fuel_price_history(database.db)
-        fetch_isk_inflation_index_history_and_write_to_file()
+
+        def fetch_crude_oil():
+            fetch_crude_oil_rate_history(database.db)
+
+        def fetch_isk_rates():
+            if pargs.backfill_workers is not None:
+                backfill_isk_rate_history(
+                    database.db,
+                    workers=pargs.backfill_workers,
+                    requests_per_second=pargs.backfill_rate
+                )
+            else:
+                fetch_isk_rate_history(database.db)
+
+        def fetch_fuel_prices():
+            if pargs.trends_source not in (None, 'github'):
+                pull_gasvaktin_repo(config)  # else trends data would be one run behind
+            fetch_icelandic_fuel_price_history(
+                database.db,
+                trends_source=pargs.trends_source,
+                gasvaktin_repo_path=os.path.expanduser(
+                    config.get('Comparison', 'gasvaktin_git_directory')
+                )
+            )
+
+        def fetch_inflation_index():
+            fetch_isk_inflation_index_history_and_write_to_file()
+
+        fetch_stages = [fetch_crude_oil, fetch_isk_rates, fetch_fuel_prices, fetch_inflation_index]
+        if pargs.parallel_fetch and pargs.in_memory:
+            # sessions of all threads would share the single in-memory database connection, and
+            # with it each other's transactions
+            if Logger is not None:
+                Logger.warning('--parallel-fetch not supported with --in-memory, ignoring.')
+        if pargs.parallel_fetch and not pargs.in_memory:
+            run_fetch_stages_concurrently(database.db, fetch_stages)
+        else:
+            for fetch_stage in fetch_stages:
+                fetch_stage()
+        if not pargs.in_memory:
+            endpoints.save_http_cache()  # fetched data stored, safe to persist cache entries
     if pargs.write_data:
         if Logger is not None:
             Logger.info('Running --write-data ..')
@@ -874,6 +1780,9 @@ def main(init_logger=True):
         write_icelandic_fuel_price_history_to_files(database.db)
         write_crude_ratio()
         read_and_write_price_diff_data(config, Logger)
+        if pargs.in_memory and pargs.fetch_data:
+            # fetched data is only stored once written to the data files in this mode
+            endpoints.save_http_cache()
     if pargs.auto_commit:
         if Logger is not None:
             Logger.info('Running --auto-commit ..')
@@ -2,28 +2,80 @@
 # -*- coding: utf-8 -*-
 # ----------------------------------------------------------------------------------------------- #
 
-from sqlalchemy import create_engine
+import threading
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 # SQLAlchemy - Declarative method
 # https://docs.sqlalchemy.org/en/13/orm/extensions/declarative/basic_use.html
 
 engine = None
 session = None
+write_lock = threading.RLock()  # serializes writes when fetching from several threads
 Base = declarative_base()
 Base.query = None
 
+# SQLite PRAGMAs set on every new connection, selected with setup_connection(sqlite_profile=..)
+SQLITE_PROFILES = {
+    'default': {},  # SQLite defaults, rollback journal with synchronous=FULL
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # WAL is still consistent after a crash, only fsync on checkpoint
+        'cache_size': -65536,  # negative is KiB, 64 MiB
+        'mmap_size': 268435456,  # 256 MiB
+        'temp_store': 'MEMORY'
+    }
+}
+
 
-def setup_connection(db_uri, db_echo=False):
+def setup_connection(db_uri, db_echo=False, sqlite_profile=None):
     global engine, session, Base
-    engine = create_engine(db_uri, convert_unicode=True, echo=db_echo)
+    if sqlite_profile is not None and sqlite_profile not in SQLITE_PROFILES:
+        raise Exception('Unknown SQLite profile "%s", expected one of: %s.' % (
+            sqlite_profile,
+            ', '.join(SQLITE_PROFILES.keys())
+        ))
+    engine_kwargs = {}
+    if is_sqlite_in_memory(db_uri):
+        # an in-memory database only lives as long as its connection, so every session (from any
+        # thread) has to share the one connection
+        engine_kwargs['poolclass'] = StaticPool
+        engine_kwargs['connect_args'] = {'check_same_thread': False}
+    engine = create_engine(db_uri, convert_unicode=True, echo=db_echo, **engine_kwargs)
+    if sqlite_profile is not None and engine.dialect.name == 'sqlite':
+        set_sqlite_pragmas(engine, SQLITE_PROFILES[sqlite_profile])
     session = scoped_session(
         sessionmaker(autocommit=False, autoflush=False, bind=engine)
     )
     Base.query = session.query_property()
 
 
+def is_sqlite_in_memory(db_uri):
+    url = make_url(db_uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def set_sqlite_pragmas(sqlite_engine, pragmas):
+    '''
+    Sets @pragmas (dict of SQLite PRAGMA names and values) on every new DBAPI connection of
+    @sqlite_engine.
+    '''
+    if len(pragmas) == 0:
+        return
+
+    @event.listens_for(sqlite_engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+
 def init_db():
     global Base
     # Import all modules here that define models so that they are registered on the metadata.
@@ -32,3 +84,112 @@ def init_db():
     #                            / silencing flake8 "imported but unused" for models
     from database import models  # noqa
     Base.metadata.create_all(bind=engine)
+    text_date_tables = get_text_date_tables()
+    if len(text_date_tables) > 0:
+        raise Exception('Date columns of tables %s are stored as text, run --migrate-db.' % (
+            ', '.join(text_date_tables),
+        ))
+    for table in Base.metadata.sorted_tables:  # create_all skips indexes of existing tables
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        connection.execute(text(models.CRUDE_OIL_BARREL_USD_MERGED_VIEW))
+
+
+def get_text_date_tables():
+    '''
+    Returns names of existing tables whose date column is stored as 'YYYY-MM-DD' text, as in
+    databases created before date columns were stored as epoch days (see
+    database.models.utility_columns.EpochDay).
+    '''
+    from database import models  # noqa
+    text_date_tables = []
+    with engine.connect() as connection:
+        for table in Base.metadata.sorted_tables:
+            if 'date' not in table.columns:
+                continue
+            for column_info in connection.execute(text('PRAGMA table_info(%s)' % (table.name, ))):
+                if column_info[1] == 'date' and column_info[2].upper() != 'INTEGER':
+                    text_date_tables.append(table.name)
+    return text_date_tables
+
+
+def migrate_date_columns(logger=None):
+    '''
+    Converts date columns stored as 'YYYY-MM-DD' text (see get_text_date_tables) to epoch day
+    integers in place, in a single transaction.
+
+    SQLite can't change the type of a column, so each table is renamed, created again with its
+    indexes from the model and its rows copied over with the dates converted. The crude oil view
+    is dropped during the migration and created again afterwards, since SQLite would otherwise
+    point it to the renamed tables.
+
+    Returns count of tables migrated.
+    '''
+    from database import models  # noqa
+    text_date_tables = get_text_date_tables()
+    if len(text_date_tables) == 0:
+        if logger is not None:
+            logger.info('Date columns already stored as epoch days, nothing to migrate.')
+        return 0
+    dbapi_connection = engine.raw_connection()
+    try:
+        isolation_level = dbapi_connection.connection.isolation_level
+        # the sqlite3 module only begins transactions before DML statements, so control the
+        # transaction explicitly to have the DDL statements in it as well
+        dbapi_connection.connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute('DROP VIEW IF EXISTS crude_oil_barrel_usd_merged')
+            for table in Base.metadata.sorted_tables:
+                if table.name not in text_date_tables:
+                    continue
+                old_table_name = '%s_migrate_old' % (table.name, )
+                cursor.execute('ALTER TABLE %s RENAME TO %s' % (table.name, old_table_name))
+                for index in table.indexes:
+                    cursor.execute('DROP INDEX IF EXISTS %s' % (index.name, ))
+                cursor.execute(str(CreateTable(table).compile(dialect=engine.dialect)))
+                for index in table.indexes:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=engine.dialect)))
+                column_names = [column.name for column in table.columns]
+                select_columns = [
+                    # julian day number of 1970-01-01 is 2440587.5
+                    'CAST(ROUND(julianday(date) - 2440587.5) AS INTEGER)'
+                    if column_name == 'date' else column_name
+                    for column_name in column_names
+                ]
+                cursor.execute('INSERT INTO %s (%s) SELECT %s FROM %s' % (
+                    table.name,
+                    ', '.join(column_names),
+                    ', '.join(select_columns),
+                    old_table_name
+                ))
+                rows_count = cursor.rowcount
+                cursor.execute('DROP TABLE %s' % (old_table_name, ))
+                if logger is not None:
+                    logger.info('Migrated date column of table %s (%s rows).' % (
+                        table.name,
+                        rows_count
+                    ))
+            cursor.execute(models.CRUDE_OIL_BARREL_USD_MERGED_VIEW)
+            cursor.execute('COMMIT')
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            dbapi_connection.connection.isolation_level = isolation_level
+    finally:
+        dbapi_connection.close()
+    return len(text_date_tables)
+
+
+def insert_or_ignore(model, rows):
+    '''
+    Inserts @rows (list of dicts keyed by column name) into the table of @model with a single
+    executemany INSERT OR IGNORE statement, rows conflicting with unique constraints are skipped.
+    Python side column defaults (like edited/created timestamps) are applied by SQLAlchemy.
+    '''
+    if len(rows) == 0:
+        return
+    session.execute(model.__table__.insert().prefix_with('OR IGNORE'), rows)
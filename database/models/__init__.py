@@ -4,6 +4,8 @@
 # ^ silence F401 warnings
 # ----------------------------------------------------------------------------------------------- #
 
+from database.models.calendar import BankHoliday
+
 from database.models.currency import ExchangeRateOfISK
 from database.models.currency import Currency
 
@@ -11,3 +13,7 @@ from database.models.commodities import CrudeOilBarrelUSD
 from database.models.commodities import CrudeOilBarrelUSDfb
 from database.models.commodities import DieselPriceIcelandLiterISK
 from database.models.commodities import PetrolPriceIcelandLiterISK
+from database.models.commodities import crude_oil_barrel_usd_merged
+from database.models.commodities import CRUDE_OIL_BARREL_USD_MERGED_VIEW
+
+from database.models.state import FetchState
@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+
+from sqlalchemy import Column, Integer, Unicode
+
+from database.db import Base
+from database.models import utility_columns
+
+
+class BankHoliday(Base):
+    __tablename__ = 'bank_holiday'
+    holiday_id = Column(Integer(), primary_key=True)
+    date = Column(utility_columns.EpochDay(), unique=True, nullable=False)
+    description = Column(Unicode(256), nullable=False, server_default='')
+    edited = utility_columns.timestamp_edited()
+    created = utility_columns.timestamp_created()
+
+    def __repr__(self):
+        return '<BankHoliday "%s" (%s)>' % (self.date, self.description)
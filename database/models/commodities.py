@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 # ----------------------------------------------------------------------------------------------- #
 
-from sqlalchemy import Column, Float, Integer, Unicode
+from sqlalchemy import Column, Float, Integer, MetaData, Table, Unicode
 
 from database.db import Base
 from database.models import utility_columns
@@ -11,7 +11,7 @@ from database.models import utility_columns
 class CrudeOilBarrelUSD(Base):
     __tablename__ = 'crude_oil_barrel_usd'
     price_id = Column(Integer(), primary_key=True)
-    date = Column(Unicode(10), unique=True, nullable=False, server_default='')
+    date = Column(utility_columns.EpochDay(), unique=True, nullable=False)
     rate = Column(Float(), nullable=False, server_default='0.0')
     edited = utility_columns.timestamp_edited()
     created = utility_columns.timestamp_created()
@@ -20,7 +20,7 @@ class CrudeOilBarrelUSD(Base):
 class CrudeOilBarrelUSDfb(Base):
     __tablename__ = 'crude_oil_barrel_usd_fallback'
     price_id = Column(Integer(), primary_key=True)
-    date = Column(Unicode(10), unique=True, nullable=False, server_default='')
+    date = Column(utility_columns.EpochDay(), unique=True, nullable=False)
     rate = Column(Float(), nullable=False, server_default='0.0')
     edited = utility_columns.timestamp_edited()
     created = utility_columns.timestamp_created()
@@ -29,7 +29,7 @@ class CrudeOilBarrelUSDfb(Base):
 class DieselPriceIcelandLiterISK(Base):
     __tablename__ = 'diesel_price_iceland_liter_isk'
     price_id = Column(Integer(), primary_key=True)
-    date = Column(Unicode(10), unique=True, nullable=False, server_default='')
+    date = Column(utility_columns.EpochDay(), unique=True, nullable=False)
     price = Column(Float(), nullable=False, server_default='0.0')
     edited = utility_columns.timestamp_edited()
     created = utility_columns.timestamp_created()
@@ -38,7 +38,30 @@ class DieselPriceIcelandLiterISK(Base):
 class PetrolPriceIcelandLiterISK(Base):
     __tablename__ = 'petrol_price_iceland_liter_isk'
     price_id = Column(Integer(), primary_key=True)
-    date = Column(Unicode(10), unique=True, nullable=False, server_default='')
+    date = Column(utility_columns.EpochDay(), unique=True, nullable=False)
     price = Column(Float(), nullable=False, server_default='0.0')
     edited = utility_columns.timestamp_edited()
     created = utility_columns.timestamp_created()
+
+
+# Crude oil rate series merged from the primary and the fallback source, fallback records only
+# fill in dates after the last primary record. Defined as an SQL view outside of Base.metadata so
+# create_all doesn't create it as a table, see database.db.init_db.
+crude_oil_barrel_usd_merged = Table(
+    'crude_oil_barrel_usd_merged',
+    MetaData(),
+    Column('date', utility_columns.EpochDay()),
+    Column('rate', Float()),
+    Column('source', Unicode(8))
+)
+
+CRUDE_OIL_BARREL_USD_MERGED_VIEW = '''
+CREATE VIEW IF NOT EXISTS crude_oil_barrel_usd_merged AS
+SELECT date, rate, 'primary' AS source FROM crude_oil_barrel_usd
+UNION ALL
+SELECT date, rate, 'fallback' AS source FROM crude_oil_barrel_usd_fallback
+WHERE date > COALESCE(
+    (SELECT MAX(date) FROM crude_oil_barrel_usd),
+    (SELECT MIN(date) - 1 FROM crude_oil_barrel_usd_fallback)
+)
+'''
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 # ----------------------------------------------------------------------------------------------- #
 
-from sqlalchemy import Column, Float, ForeignKey, Integer, Unicode, UniqueConstraint
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, Unicode, UniqueConstraint
 
 from database.db import Base
 from database.models import utility_columns
@@ -12,7 +12,7 @@ class ExchangeRateOfISK(Base):
     __tablename__ = 'exchange_rate_of_isk'
     rate_id = Column(Integer(), primary_key=True)
     fk_currency = Column(Integer(), ForeignKey('currency.currency_id'))
-    date = Column(Unicode(10), nullable=False, server_default='')
+    date = Column(utility_columns.EpochDay(), nullable=False)
     buy = Column(Float(), nullable=False, server_default='0.0')
     sell = Column(Float(), nullable=False, server_default='0.0')
     mean = Column(Float(), nullable=False, server_default='0.0')
@@ -20,6 +20,7 @@ class ExchangeRateOfISK(Base):
     created = utility_columns.timestamp_created()
     __table_args__ = (
         UniqueConstraint('fk_currency', 'date', name='_currency_date_uc'),
+        Index('ix_exchange_rate_of_isk_date', 'date'),  # date ranges and span across currencies
     )
 
     def __repr__(self):
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+
+from sqlalchemy import Column, Integer, Unicode, UnicodeText
+
+from database.db import Base
+from database.models import utility_columns
+
+
+class FetchState(Base):
+    '''
+    Key/value state kept between runs by the fetch functions, like hashes of source files already
+    processed, so unchanged sources can be skipped.
+    '''
+    __tablename__ = 'fetch_state'
+    state_id = Column(Integer(), primary_key=True)
+    key = Column(Unicode(256), unique=True, nullable=False, server_default='')
+    value = Column(UnicodeText(), nullable=False, server_default='')
+    edited = utility_columns.timestamp_edited()
+    created = utility_columns.timestamp_created()
+
+    def __repr__(self):
+        return '<FetchState "%s">' % (self.key, )
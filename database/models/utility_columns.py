@@ -3,7 +3,10 @@
 # ----------------------------------------------------------------------------------------------- #
 import datetime
 
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Integer
+from sqlalchemy.types import TypeDecorator
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
 
 
 def timestamp_created():
@@ -16,3 +19,45 @@ def timestamp_edited():
         default=datetime.datetime.utcnow,
         onupdate=datetime.datetime.utcnow
     )
+
+
+def date_to_epoch_day(value):
+    '''
+    Returns @value ('YYYY-MM-DD' string, datetime.date or datetime.datetime) as count of days
+    since 1970-01-01, None stays None.
+    '''
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    elif not isinstance(value, datetime.date):
+        value = datetime.date.fromisoformat(value)
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def epoch_day_to_date(value):
+    '''
+    Returns @value (count of days since 1970-01-01) as 'YYYY-MM-DD' string, None stays None.
+    '''
+    if value is None:
+        return None
+    return datetime.date.fromordinal(value + EPOCH_ORDINAL).isoformat()
+
+
+class EpochDay(TypeDecorator):
+    '''
+    Date stored as integer count of days since 1970-01-01 (see date_to_epoch_day), but read and
+    written as 'YYYY-MM-DD' strings, so comparisons and ordering in the database are integer
+    operations while the ORM API works with the same date strings as the CSV data files.
+    '''
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return date_to_epoch_day(value)
+
+    def process_literal_param(self, value, dialect):
+        return str(date_to_epoch_day(value))
+
+    def process_result_value(self, value, dialect):
+        return epoch_day_to_date(value)
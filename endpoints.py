@@ -1,51 +1,330 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 # ----------------------------------------------------------------------------------------------- #
+import bisect
 import calendar
 import csv
 import datetime
-import io
+import hashlib
+import os
 import json
 import re
+import tempfile
+import threading
 import time
+import urllib.parse
+import zipfile
 
+import git
 import lxml.etree
 import requests
+import requests.adapters
+import requests.utils
+
+import http_cache
+import icelandic_holidays
 
 USER_AGENT = 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:63.0) Gecko/20100101 Firefox/63.0'
+ISK_EXCHANGE_RATE_URL = 'https://www.sedlabanki.is/hagtolur/opinber-gengisskraning/'
+ISK_EXCHANGE_RATE_FORM_STATE_KEYS = ('__EVENTVALIDATION', '__VIEWSTATE', '__VIEWSTATEGENERATOR')
+ISK_EXCHANGE_RATE_EXPORT_COLUMNS = {
+    'date': 'date', 'dagsetning': 'date', 'dags': 'date',
+    'code': 'code', 'currency': 'code', 'mynt': 'code', 'kóði': 'code',
+    'name': 'name', 'nafn': 'name', 'heiti': 'name',
+    'buy': 'buy', 'kaup': 'buy', 'kaupgengi': 'buy',
+    'sell': 'sell', 'sala': 'sell', 'sölugengi': 'sell',
+    'mean': 'mean', 'value': 'mean', 'miðgengi': 'mean', 'gengi': 'mean',
+}
+GASVAKTIN_TRENDS_URL = (
+    'https://raw.githubusercontent.com/gasvaktin/gasvaktin/master/vaktin/trends.min.json'
+)
+GASVAKTIN_TRENDS_PATH = 'vaktin/trends.min.json'
+GASVAKTIN_BEGINNING = datetime.datetime(2016, 4, 19)
+FIB_FUEL_PRICE_URL = (
+    'https://www.fib.is/is/billinn/eldsneytisvakt-fib/eldsneytisvaktin-throun?'
+    'companies=&'
+    'start=1995-10-01&'
+    'petrol=bensin'
+)
+FIB_MEAN_PRICES_PETROL_URL = 'https://www.fib.is/eldsneytisvakt_fib/data/mean_prices_bensin.csv'
+FIB_MEAN_PRICES_DIESEL_URL = 'https://www.fib.is/eldsneytisvakt_fib/data/mean_prices_diesel.csv'
+CRUDE_OIL_RATE_HISTORY_URL = 'https://www.mbl.is/vidskipti/oliuverd/'
+CRUDE_OIL_FALLBACK_URL = 'https://markets.businessinsider.com/commodities/oil-price/usd?type=brent'
+CRUDE_OIL_FALLBACK_CHART_DATA_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'accept': 'application/json, text/plain, */*',
+    'accept-language': 'en-US,en;q=0.9',
+    'referer': CRUDE_OIL_FALLBACK_URL,
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin'
+}
+EIA_BULK_PETROLEUM_URL = 'https://api.eia.gov/bulk/PET.zip'
+EIA_BRENT_SPOT_DAILY_SERIES_ID = 'PET.RBRTE.D'
+ISK_STATUTORY_HOLIDAY_MSG = bytes(
+    'er lögbundinn frídagur, en það er ekkert gengi skráð á slíkum dögum.',
+    'utf-8'
+)
+
+ISK_INFLATION_INDEX_LANDING_URL = 'https://hagstofa.is/verdlagsreiknivel'
+ISK_INFLATION_INDEX_URL = (
+    'https://px.hagstofa.is/pxis/api/v1/is/Efnahagur/visitolur/1_vnv/1_vnv/VIS01002.px'
+)
+HTTP_TIMEOUT = (10.0, 60.0)  # seconds, (connect timeout, read timeout)
+HTTP_POOL_DEFAULT_MAXSIZE = 2  # connections kept alive per host
+HTTP_POOL_MAXSIZE = {  # hosts queried by parallel workers get bigger pools
+    'www.sedlabanki.is': 8,
+}
+
+RateLimiters = {}
+RateLimitersLock = threading.Lock()
+HTTPAdapters = None
+HTTPAdaptersLock = threading.Lock()
+# returned by endpoints instead of data when HTTP cache is enabled and upstream content hasn't
+# changed since the cache was last saved, callers can then skip parsing and database work
+NOT_MODIFIED = 'NOT_MODIFIED'
+HTTPCache = None
+
+
+class TokenBucket(object):
+    '''
+    Thread safe token bucket, used to keep the total request rate towards a host polite when
+    several workers are querying it at the same time.
+
+    Usage:  bucket = TokenBucket(rate, capacity)
+            bucket.acquire()
+    Before: @rate is the number of requests per second allowed on average, @capacity is the
+            number of requests allowed to burst.
+    After:  acquire() blocks until a token is available and then consumes it.
+    '''
+
+    def __init__(self, rate, capacity=1):
+        assert(rate > 0)
+        assert(capacity >= 1)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.timestamp) * self.rate
+                )
+                self.timestamp = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_seconds = (1.0 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+def get_rate_limiter(url, rate=1.0, capacity=1):
+    '''
+    Returns the shared TokenBucket for the host of @url, creating it with @rate and @capacity if
+    it doesn't exist yet. All workers talking to the same host share the same bucket.
+    '''
+    host = urllib.parse.urlsplit(url).netloc
+    with RateLimitersLock:
+        if host not in RateLimiters:
+            RateLimiters[host] = TokenBucket(rate, capacity)
+        return RateLimiters[host]
+
+
+class HTTPSession(requests.Session):
+    '''
+    requests.Session using connection pools shared by all HTTPSession instances (see
+    get_http_session), with default timeouts, User-Agent and Accept-Encoding listing only the
+    compressions we can decode. Each instance has its own cookies, so workers with their own
+    server side state (like ASP.NET form state) don't step on each other.
+    '''
+
+    def __init__(self, timeout=HTTP_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self.headers['User-Agent'] = USER_AGENT
+        self.headers['Accept-Encoding'] = requests.utils.DEFAULT_ACCEPT_ENCODING
+        self.adapters.clear()
+        for prefix, adapter in _get_http_adapters():
+            self.mount(prefix, adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+    def close(self):
+        pass  # adapters and their connection pools are shared, keep them open
+
+
+def _get_http_adapters():
+    global HTTPAdapters
+    with HTTPAdaptersLock:
+        if HTTPAdapters is None:
+            default_adapter = requests.adapters.HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=HTTP_POOL_DEFAULT_MAXSIZE
+            )
+            adapters = [('https://', default_adapter), ('http://', default_adapter)]
+            for host, pool_maxsize in HTTP_POOL_MAXSIZE.items():
+                adapters.append(('https://%s/' % (host, ), requests.adapters.HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=pool_maxsize
+                )))
+            HTTPAdapters = adapters
+        return HTTPAdapters
+
+
+def get_http_session(timeout=HTTP_TIMEOUT):
+    '''
+    HTTP client factory, all endpoint functions get their sessions from here.
+
+    Usage:  session = get_http_session()
+    Before: @timeout is optional, (connect timeout, read timeout) in seconds.
+    After:  @session is a new HTTPSession, thread safe to create from any thread, sharing keep
+            alive connections with all other sessions (pool size per host set in
+            HTTP_POOL_MAXSIZE, HTTP_POOL_DEFAULT_MAXSIZE otherwise). A session itself should only
+            be used by one thread at a time.
+    '''
+    return HTTPSession(timeout=timeout)
 
 
-def get_isk_exchange_rate(req_date, logger=None):
+def set_http_cache(directory):
+    '''
+    Enables on-disk conditional HTTP cache (see http_cache.HTTPCache) for the crude oil, fuel
+    price and inflation index endpoints, or disables it if @directory is None.
+    '''
+    global HTTPCache
+    if directory is None:
+        HTTPCache = None
+    else:
+        HTTPCache = http_cache.HTTPCache(directory)
+
+
+def save_http_cache():
+    '''
+    Persists HTTP cache entries fetched so far, should be called once the fetched data has been
+    processed so content is not reported NOT_MODIFIED before it has been stored.
+    '''
+    if HTTPCache is not None:
+        HTTPCache.save()
+
+
+def _request(session, method, url, headers=None, data=None, conditional=True, cache_key=None):
+    '''
+    Sends request through HTTP cache if enabled, returns tuple of response body and whether it
+    was modified (always True with cache disabled or @conditional False). @cache_key is optional,
+    see http_cache.HTTPCache.
+    '''
+    if HTTPCache is not None:
+        return HTTPCache.request(
+            session,
+            method,
+            url,
+            headers=headers,
+            data=data,
+            conditional=conditional,
+            cache_key=cache_key
+        )
+    res = session.request(method, url, headers=headers, data=data)
+    res.raise_for_status()
+    return res.content, True
+
+
+def get_isk_exchange_rate(req_date, logger=None, rate_limiter=None):
     '''
     Extracts public exchange rate for ISK from Central Bank of Iceland for a given date.
 
     Central Bank of Iceland currently provides exchange rate from ISK to the following currencies:
     USD, GBP, CAD, DKK, NOK, SEK, CHF, JPY, XDR, EUR (EUR since 1999-01-05)
 
-    Usage:  res_data = get_central_bank_iceland_isk_exchange_rate(req_date)
+    Usage:  res_data = get_isk_exchange_rate(req_date)
     Before: @req_date is a datetime.datetime object containing date in the range 1981-01-01 to our
-            present date.
+            present date. @rate_limiter is optional, if provided it's a TokenBucket which is
+            acquired before each request instead of sleeping between requests.
     After:  @res_data is a dict containing exchange rate info for given @req_date if available.
 
     Note: Central Bank of Iceland does not log exchange rate on weekdays or on specific icelandic
-          holidays. If @req_date is a weekend we return nothing but that message and don't even
-          query sedlabanki.is, if @req_date is revealed to be an icelandic holiday after querying
-          sedlabanki.is we also return nothing but that message. Future @req_date dates are not
-          possible for obvious reasons.
+          holidays. If @req_date is a weekend or a precomputed icelandic bank holiday (see
+          icelandic_holidays.py) we return nothing but that message and don't even query
+          sedlabanki.is, if @req_date is revealed to be an icelandic holiday after querying
+          sedlabanki.is we also return nothing but that message, with ['status']['holiday'] set to
+          True. If sedlabanki.is doesn't show rates for @req_date even with a fresh form state we
+          return nothing but an error message, with ['status']['holiday'] left False so the date
+          is tried again on a later run. Future @req_date dates are not possible for obvious
+          reasons.
+    '''
+    return next(get_isk_exchange_rates([req_date], logger=logger, rate_limiter=rate_limiter))
+
+
+def get_isk_exchange_rates(dates, logger=None, rate_limiter=None):
+    '''
+    Batch version of get_isk_exchange_rate, extracts public exchange rate for ISK from Central Bank
+    of Iceland for a sequence of dates.
+
+    The ASP.NET form state (__VIEWSTATE, __EVENTVALIDATION and __VIEWSTATEGENERATOR) is read from
+    the landing page once and then reused for every date, all POST requests are sent over the
+    same keep-alive connection. The form state is only refreshed if the server rejects it.
+
+    Usage:  for res_data in get_isk_exchange_rates(dates): ..
+    Before: @dates is an iterable of datetime.datetime objects, each in the range 1981-01-01 to our
+            present date. @rate_limiter is optional, see get_isk_exchange_rate.
+    After:  Yields a dict per date in @dates, in the same order, containing exchange rate info for
+            the date if available (see get_isk_exchange_rate).
     '''
+    session = None
+    form_state = None
+    for req_date in dates:
+        data = _isk_exchange_rate_data(req_date)
+        if _isk_exchange_rate_unavailable(req_date, data, logger):
+            yield data
+            continue
+        if session is None:
+            session = get_http_session()
+        res = None
+        for attempt in range(2):
+            if form_state is None:
+                form_state = _get_isk_exchange_rate_form_state(session, rate_limiter)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            else:
+                time.sleep(0.8)  # just to look polite
+            res = _post_isk_exchange_rate_form(session, form_state, req_date)
+            if not _isk_exchange_rate_form_rejected(res.status_code, res.content, req_date):
+                break
+            if logger is not None:
+                logger.info('Form state rejected by sedlabanki.is, refreshing ..')
+            form_state = None
+        res.raise_for_status()
+        if _isk_exchange_rate_form_rejected(res.status_code, res.content, req_date):
+            yield _isk_exchange_rate_not_shown(data, logger)
+            continue
+        yield _parse_isk_exchange_rate_response(res.content, req_date, data, logger)
+
+
+def _isk_exchange_rate_data(req_date):
     beginning = datetime.datetime(1981, 1, 1)
     assert(beginning <= req_date)
     today = datetime.datetime.now()
     assert(req_date <= today)
-    date_str = req_date.strftime('%Y-%m-%d')
-    data = {
-        'date': date_str,
+    return {
+        'date': req_date.strftime('%Y-%m-%d'),
         'currencies': {},
         'status': {
             'success': True,
+            'holiday': False,
             'msg': ''
         }
     }
+
+
+def _isk_exchange_rate_unavailable(req_date, data, logger=None):
+    # weekends and precomputed holidays, no need to query sedlabanki.is
+    date_str = data['date']
     if req_date.weekday() in (5, 6):
         data['status']['success'] = False
         data['status']['msg'] = 'No currency rates on weekdays, "%s" %s.' % (
@@ -54,37 +333,99 @@ def get_isk_exchange_rate(req_date, logger=None):
         )
         if logger is not None:
             logger.info(data['status']['msg'])
-        return data
-    session = requests.Session()
-    url = 'https://www.sedlabanki.is/hagtolur/opinber-gengisskraning/'
-    res1 = session.get(url, headers={'User-Agent': USER_AGENT})
-    res1.raise_for_status()
+        return True
+    holiday_name = icelandic_holidays.get_icelandic_bank_holiday(req_date)
+    if holiday_name is not None:
+        data['status']['success'] = False
+        data['status']['holiday'] = True
+        data['status']['msg'] = 'No currency rates on holidays, "%s" is %s.' % (
+            date_str,
+            holiday_name
+        )
+        if logger is not None:
+            logger.info(data['status']['msg'])
+        return True
+    return False
+
+
+def _isk_exchange_rate_not_shown(data, logger=None):
+    # rates for the date still not shown with a fresh form state, could be a temporary error page
+    # or changed page markup, so we don't take it as a sign of the date having no rates
+    data['status']['success'] = False
+    data['status']['msg'] = 'sedlabanki.is did not show currency rates for "%s".' % (
+        data['date'],
+    )
+    if logger is not None:
+        logger.error(data['status']['msg'])
+    return data
+
+
+def _get_isk_exchange_rate_form_state(session, rate_limiter=None):
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    res = session.get(ISK_EXCHANGE_RATE_URL, headers={'User-Agent': USER_AGENT})
+    res.raise_for_status()
+    return _parse_isk_exchange_rate_form_state(res.content)
+
+
+def _parse_isk_exchange_rate_form_state(content):
+    page = parse_isk_exchange_rate_page(content, tables_count=0)
+    return {
+        '__EVENTVALIDATION': page['inputs']['__EVENTVALIDATION'],
+        '__VIEWSTATE': page['inputs']['__VIEWSTATE'],
+        '__VIEWSTATEGENERATOR': page['inputs']['__VIEWSTATEGENERATOR'],
+    }
+
+
+def _post_isk_exchange_rate_form(session, form_state, req_date):
+    headers_for_post, form_data_for_post = _isk_exchange_rate_form_post(form_state, req_date)
+    return session.post(ISK_EXCHANGE_RATE_URL, headers=headers_for_post, data=form_data_for_post)
+
+
+def _isk_exchange_rate_form_post(form_state, req_date):
     headers_for_post = {
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
         'Accept-Language': 'en-US,en;q=0.5',
         'Connection': 'keep-alive',
         'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
         'Host': 'www.sedlabanki.is',
-        'Referer': url,
+        'Referer': ISK_EXCHANGE_RATE_URL,
         'User-Agent': USER_AGENT
     }
-    html1 = lxml.etree.fromstring(res1.content, lxml.etree.HTMLParser())
-    form_data_for_post = {
-        '__EVENTVALIDATION': html1.find('.//input[@id="__EVENTVALIDATION"]').get('value'),
-        '__VIEWSTATE': html1.find('.//input[@id="__VIEWSTATE"]').get('value'),
-        '__VIEWSTATEGENERATOR': html1.find('.//input[@id="__VIEWSTATEGENERATOR"]').get('value'),
+    form_data_for_post = dict(form_state)
+    form_data_for_post.update({
         'ctl00$ctl00$Content$Content$ctl04$btnGetGengi': 'Sækja',
         'ctl00$ctl00$Content$Content$ctl04$ddlDays': str(req_date.day),
         'ctl00$ctl00$Content$Content$ctl04$ddlMonths': str(req_date.month),
         'ctl00$ctl00$Content$Content$ctl04$ddlYears': str(req_date.year)
-    }
-    time.sleep(0.8)  # just to look polite
-    res2 = session.post(url, headers=headers_for_post, data=form_data_for_post)
-    res2.raise_for_status()
-    staturory_holiday_msg = 'er lögbundinn frídagur, en það er ekkert gengi skráð á slíkum dögum.'
-    if bytes(staturory_holiday_msg, 'utf-8') in res2.content:
+    })
+    return headers_for_post, form_data_for_post
+
+
+def _isk_exchange_rate_form_rejected(status_code, content, req_date):
+    # ASP.NET answers a stale or invalid form state either with a server error or by rendering the
+    # landing page again, showing the latest rates instead of rates for the requested date
+    if status_code >= 500:
+        return True
+    if status_code >= 400:
+        return False  # let raise_for_status report other errors
+    if ISK_STATUTORY_HOLIDAY_MSG in content:
+        return False
+    shown_date_strs = (
+        'Skráning: %s' % (req_date.strftime('%d.%m.%Y'), ),
+        'Skráning: %s.%s.%s' % (req_date.day, req_date.month, req_date.year)
+    )
+    for shown_date_str in shown_date_strs:
+        if bytes(shown_date_str, 'utf-8') in content:
+            return False
+    return True
+
+
+def _parse_isk_exchange_rate_response(content, req_date, data, logger=None):
+    date_str = data['date']
+    if ISK_STATUTORY_HOLIDAY_MSG in content:
         data['status']['success'] = False
+        data['status']['holiday'] = True
         data['status']['msg'] = '%s, "%s" %s.' % (
             'No currency rates were returned because of staturory holiday',
             date_str,
@@ -93,8 +434,8 @@ def get_isk_exchange_rate(req_date, logger=None):
         if logger is not None:
             logger.info(data['status']['msg'])
         return data
-    html2 = lxml.etree.fromstring(res2.content, lxml.etree.HTMLParser())
-    html2tables = html2.findall('.//table')
+    page = parse_isk_exchange_rate_page(content, tables_count=2, form_inputs=False)
+    html2tables = page['tables']
     shown_date = datetime.datetime.strptime(
         html2tables[1].find('.//tr/td/span').text,
         'Skráning: %d.%m.%Y'
@@ -118,7 +459,187 @@ def get_isk_exchange_rate(req_date, logger=None):
     return data
 
 
-def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None):
+def parse_isk_exchange_rate_page(content, tables_count=2, form_inputs=True, chunk_size=16384):
+    '''
+    Extracts the hidden ASP.NET form inputs and the first table elements from a sedlabanki.is
+    exchange rate page, without building a tree of the whole document.
+
+    Each form state input tag is located in @content and parsed on its own. The tables are
+    extracted by feeding @content, from the first table tag on, in chunks to a pull parser which
+    only reports table elements. Tables are collected as they start, in document order with nested
+    tables included like findall('.//table') would list them, and feeding stops as soon as the
+    first @tables_count tables have ended so the (large) rest of the page is never parsed.
+
+    Usage:  res_data = parse_isk_exchange_rate_page(content, tables_count, form_inputs)
+    Before: @content is the page as bytes, @tables_count is the number of top level tables wanted,
+            @form_inputs is a bool, if True the three ASP.NET form state inputs are extracted.
+            @chunk_size is optional, number of bytes fed to the parser at a time.
+    After:  @res_data is a dict containing 'inputs', a dict of form state input values by id, and
+            'tables', a list of up to @tables_count lxml table elements.
+    '''
+    page = {
+        'inputs': {},
+        'tables': []
+    }
+    if form_inputs:
+        for input_id in ISK_EXCHANGE_RATE_FORM_STATE_KEYS:
+            id_offset = content.find(bytes('id="%s"' % (input_id, ), 'ascii'))
+            if id_offset == -1:
+                continue
+            tag_start = content.rfind(b'<input', 0, id_offset)
+            tag_end = content.find(b'>', id_offset)
+            element = lxml.etree.fromstring(
+                content[tag_start:tag_end + 1],
+                lxml.etree.HTMLParser(encoding='utf-8')
+            ).find('.//input')
+            page['inputs'][input_id] = element.get('value')
+    if tables_count == 0:
+        return page
+    # note: libxml2 HTML push parser stalls on very large attribute values like __VIEWSTATE, so
+    # we start feeding it at the first table tag
+    match = re.search(b'<table', content, re.IGNORECASE)
+    if match is None:
+        return page
+    parser = lxml.etree.HTMLPullParser(events=('start', 'end'), tag='table', encoding='utf-8')
+    open_tables = set()
+    chunks = [
+        content[offset:offset + chunk_size]
+        for offset in range(match.start(), len(content), chunk_size)
+    ]
+    for chunk in chunks + [None]:
+        if chunk is not None:
+            parser.feed(chunk)
+        else:
+            parser.close()  # end of document reached, flush remaining events
+        for event, element in parser.read_events():
+            if event == 'start':
+                if len(page['tables']) < tables_count:
+                    page['tables'].append(element)
+                    open_tables.add(element)
+            else:
+                open_tables.discard(element)
+        if len(page['tables']) >= tables_count and len(open_tables) == 0:
+            break
+    return page
+
+
+def get_isk_exchange_rate_export(source, logger=None):
+    '''
+    Streams a multi-day ISK exchange rate export file from Central Bank of Iceland, to rebuild
+    years of exchange rate history with a handful of requests instead of one POST per date.
+
+    Supported formats are CSV (comma or semicolon separated, with a header row) and row oriented
+    XML (each row an element with the values as attributes or child elements). Column and element
+    names are matched case insensitively against ISK_EXCHANGE_RATE_EXPORT_COLUMNS, so both the
+    english and icelandic names are understood. Dates can be on the form YYYY-MM-DD or DD.MM.YYYY
+    and numbers may use decimal comma.
+
+    Usage:  for res_data in get_isk_exchange_rate_export(source): ..
+    Before: @source is either an URL (http:// or https://) or a path to a local file, format is
+            decided by file extension or response content type, XML if it ends with .xml or the
+            content type mentions xml, otherwise CSV.
+    After:  Yields a dict per currency per day, containing 'date' (YYYY-MM-DD), 'code', 'name'
+            (None if not in export), 'buy', 'sell' and 'mean' (None if not in export).
+    '''
+    if logger is not None:
+        logger.info('Reading ISK exchange rate export "%s" ..' % (source, ))
+    count = 0
+    if source.startswith('http://') or source.startswith('https://'):
+        res = get_http_session().get(source, stream=True)
+        res.raise_for_status()
+        content_type = res.headers.get('Content-Type', '')
+        if source.lower().endswith('.xml') or 'xml' in content_type:
+            res.raw.decode_content = True
+            rows = _iter_isk_exchange_rate_export_xml(res.raw)
+        else:
+            lines = (line.decode('utf-8-sig') for line in res.iter_lines())
+            rows = _iter_isk_exchange_rate_export_csv(lines)
+        for row in rows:
+            count += 1
+            yield row
+    else:
+        if source.lower().endswith('.xml'):
+            with open(source, mode='rb') as export_file:
+                for row in _iter_isk_exchange_rate_export_xml(export_file):
+                    count += 1
+                    yield row
+        else:
+            with open(source, mode='r', encoding='utf-8-sig', newline='') as export_file:
+                for row in _iter_isk_exchange_rate_export_csv(export_file):
+                    count += 1
+                    yield row
+    if logger is not None:
+        logger.info('Read %s rows from ISK exchange rate export.' % (count, ))
+
+
+def _iter_isk_exchange_rate_export_csv(lines):
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    columns = next(csv.reader([header], delimiter=delimiter))
+    reader = csv.DictReader(lines, fieldnames=columns, delimiter=delimiter)
+    for line in reader:
+        row = _isk_exchange_rate_export_row(line)
+        if row is not None:
+            yield row
+
+
+def _iter_isk_exchange_rate_export_xml(export_file):
+    for _, element in lxml.etree.iterparse(export_file, events=('end', )):
+        values = dict(element.attrib)
+        for child in element:
+            if len(child) == 0 and isinstance(child.tag, str):
+                values[lxml.etree.QName(child).localname] = child.text
+        row = _isk_exchange_rate_export_row(values)
+        if row is not None:
+            yield row
+            element.clear()  # keep memory bounded, we're done with this row
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+def _isk_exchange_rate_export_row(values):
+    row = {}
+    for key, value in values.items():
+        if key is None:
+            continue
+        column = ISK_EXCHANGE_RATE_EXPORT_COLUMNS.get(key.strip().lower())
+        if column is not None and value is not None and value.strip() != '':
+            row[column] = value.strip()
+    if 'date' not in row or 'code' not in row or 'mean' not in row:
+        return None
+    date = None
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            date = datetime.datetime.strptime(row['date'], date_format)
+            break
+        except ValueError:
+            continue
+    if date is None:
+        raise Exception('Unknown date format "%s" in ISK exchange rate export.' % (row['date'], ))
+    return {
+        'date': date.strftime('%Y-%m-%d'),
+        'code': row['code'].upper(),
+        'name': row.get('name'),
+        'buy': _parse_export_number(row.get('buy')),
+        'sell': _parse_export_number(row.get('sell')),
+        'mean': _parse_export_number(row.get('mean')),
+    }
+
+
+def _parse_export_number(text):
+    if text is None:
+        return None
+    if ',' in text and '.' in text:
+        # both "1.234,56" and "1,234.56" occur, the last separator is the decimal point
+        thousands_separator = '.' if text.rfind(',') > text.rfind('.') else ','
+        text = text.replace(thousands_separator, '')
+    return float(text.replace(',', '.'))
+
+
+def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None, conditional=True):
     '''
     Extracts historical crude oil prices in USD/bbl from mbl.is (data originates from eia.gov,
     U.S. Energy Information Administration).
@@ -126,7 +647,8 @@ def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None):
     The U.S. Energy Information Administration has data from 1987-05-20 to current date, they do
     offer bulk download and also an API, but to use the API we need to register for an access key.
     The bulk download way is .. bulky. There are at this time of writing 13 separate bulk files
-    available, the PET.zip file containing EU brent crude oil price is around 50 MB in size.
+    available, the PET.zip file containing EU brent crude oil price is around 50 MB in size, see
+    get_crude_oil_rate_history_eia_bulk for streaming the full history out of it in one pass.
     See: https://www.eia.gov/opendata/bulkfiles.pyp
 
     Fortunately, mbl.is seems to have started fetching this data from eia.gov and makes it easily
@@ -135,11 +657,39 @@ def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None):
     Usage:  res_data = get_crude_oil_rate_history(date_a, date_b)
     Before: @date_a and @date_b are both optional parameters, both should be datetime.datetime
             objects, @date_a represents start date (set to 1987-05-20 if omitted) and @date_b
-            represents end date (set to todays date if omitted)
-    After:  @res_data is a dict containing crude oil price rate for a selected timeframe.
+            represents end date (set to todays date if omitted). @conditional is optional, set to
+            False to get the data even if HTTP cache considers it not modified.
+    After:  @res_data is a dict containing crude oil price rate for a selected timeframe, or
+            NOT_MODIFIED if HTTP cache is enabled and the data hasn't changed.
 
     Note: Crude Oil rate not available for weekends and some US staturory holidays.
     '''
+    start_date, end_date = _crude_oil_rate_history_window(date_a, date_b)
+    # url = (
+    #     'https://api.eia.gov/v2/petroleum/pri/spt/data/?api_key={access_key}'
+    #     '&frequency=daily'
+    #     '&data[0]=value'
+    #     '&start={start_date}'
+    #     '&end={end_date}'
+    #     '&sort[0][column]=period'
+    #     '&sort[direction]=desc'
+    #     '&offset=0'
+    #     '&length=5000'
+    # ).format(access_key='DUMMY_KEY', start_date='2023-01-01', end_date='2023-02-01')
+    content, modified = _request(
+        get_http_session(),
+        'GET',
+        CRUDE_OIL_RATE_HISTORY_URL,
+        conditional=conditional
+    )
+    if not modified:
+        if logger is not None:
+            logger.info('Crude Oil rate data not modified since last fetch.')
+        return NOT_MODIFIED
+    return _parse_crude_oil_rate_history_page(content, start_date, end_date, logger=logger)
+
+
+def _crude_oil_rate_history_window(date_a=None, date_b=None):
     if date_a is None:
         start_date = datetime.datetime(1987, 5, 20)
     else:
@@ -151,22 +701,12 @@ def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None):
         assert(type(date_b) == datetime.datetime)
         end_date = date_b
     assert(start_date <= end_date)
+    return start_date, end_date
+
+
+def _parse_crude_oil_rate_history_page(content, start_date, end_date, logger=None):
     today = datetime.datetime.now()
-    # url = (
-    #     'https://api.eia.gov/v2/petroleum/pri/spt/data/?api_key={access_key}'
-    #     '&frequency=daily'
-    #     '&data[0]=value'
-    #     '&start={start_date}'
-    #     '&end={end_date}'
-    #     '&sort[0][column]=period'
-    #     '&sort[direction]=desc'
-    #     '&offset=0'
-    #     '&length=5000'
-    # ).format(access_key='DUMMY_KEY', start_date='2023-01-01', end_date='2023-02-01')
-    url = 'https://www.mbl.is/vidskipti/oliuverd/'
-    res = requests.get(url, headers={'User-Agent': USER_AGENT})
-    res.raise_for_status()
-    html = lxml.etree.fromstring(res.content, lxml.etree.HTMLParser())
+    html = lxml.etree.fromstring(content, lxml.etree.HTMLParser())
     data_str = None
     data = None
     parsed_data = {}
@@ -185,13 +725,22 @@ def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None):
             break
     if data is None:
         raise Exception('Failed to locate data.')
-    for epoch_time, price in data:
+    # window is [start_date, min(end_date, today)) in whole days, compared in epoch milliseconds
+    # so only the points we keep get converted and formatted
+    lower_day = datetime.datetime(start_date.year, start_date.month, start_date.day)
+    upper_day = min(
+        datetime.datetime(end_date.year, end_date.month, end_date.day),
+        datetime.datetime(today.year, today.month, today.day)
+    )
+    epochs = [epoch_time for epoch_time, price in data]
+    if any(epochs[i] > epochs[i + 1] for i in range(len(epochs) - 1)):
+        data = sorted(data, key=lambda point: point[0])
+        epochs = [epoch_time for epoch_time, price in data]
+    lower = bisect.bisect_left(epochs, lower_day.timestamp() * 1000)
+    upper = bisect.bisect_left(epochs, upper_day.timestamp() * 1000)
+    for epoch_time, price in data[lower:upper]:
         date_datetime = datetime.datetime.fromtimestamp(epoch_time / 1000)
         date_isoformatted = date_datetime.strftime('%Y-%m-%d')
-        if (date_isoformatted < start_date.strftime('%Y-%m-%d') or
-            end_date.strftime('%Y-%m-%d') <= date_isoformatted or
-                today.strftime('%Y-%m-%d') <= date_isoformatted):
-            continue  # strip away data for unwanted days
         value_float = float(price)
         parsed_data[date_isoformatted] = value_float
     assert(len(parsed_data.keys()) > 0)
@@ -204,7 +753,68 @@ def get_crude_oil_rate_history(date_a=None, date_b=None, logger=None):
     return parsed_data
 
 
-def get_crude_oil_rate_history_fallback(logger=None):
+def get_crude_oil_rate_history_eia_bulk(source=None, series_id=None, logger=None):
+    '''
+    Streams historical crude oil prices in USD/bbl out of the U.S. Energy Information
+    Administration bulk petroleum file (PET.zip), no access key required.
+
+    The zip contains a single text file with one JSON object per line, one line per series, the
+    EU brent daily spot price series being one of several thousand. The file member is read line
+    by line and only the line of the wanted series is JSON decoded, so memory use is bounded by
+    the size of a single line rather than the size of the file.
+
+    Usage:  for date_str, price in get_crude_oil_rate_history_eia_bulk(source): ..
+    Before: @source is optional, either an URL (http:// or https://) or a path to a local PET.zip
+            file, EIA_BULK_PETROLEUM_URL is used if omitted. A downloaded file is spooled to a
+            temporary file since zip archives need to be seekable. @series_id is optional, set
+            to EIA_BRENT_SPOT_DAILY_SERIES_ID if omitted.
+    After:  Yields (date, price) tuples in ascending date order, date as YYYY-MM-DD string and
+            price as float, dates with no price are skipped.
+    '''
+    if source is None:
+        source = EIA_BULK_PETROLEUM_URL
+    if series_id is None:
+        series_id = EIA_BRENT_SPOT_DAILY_SERIES_ID
+    if logger is not None:
+        logger.info('Reading EIA bulk file "%s" for series %s ..' % (source, series_id))
+    if source.startswith('http://') or source.startswith('https://'):
+        with tempfile.TemporaryFile() as zip_file:
+            res = get_http_session().get(source, stream=True)
+            res.raise_for_status()
+            for chunk in res.iter_content(chunk_size=1024 * 1024):
+                zip_file.write(chunk)
+            zip_file.seek(0)
+            series = _read_eia_bulk_series(zip_file, series_id)
+    else:
+        with open(source, mode='rb') as zip_file:
+            series = _read_eia_bulk_series(zip_file, series_id)
+    if series is None:
+        raise Exception('Series %s not found in EIA bulk file.' % (series_id, ))
+    count = 0
+    for period, price in sorted(series['data'], key=lambda point: point[0]):
+        if price is None:
+            continue
+        count += 1
+        yield ('%s-%s-%s' % (period[0:4], period[4:6], period[6:8]), float(price))
+    if logger is not None:
+        logger.info('Read %s lines of series %s from EIA bulk file.' % (count, series_id))
+
+
+def _read_eia_bulk_series(zip_file, series_id):
+    marker = ('"series_id":"%s"' % (series_id, )).encode('utf-8')
+    with zipfile.ZipFile(zip_file) as archive:
+        for member in archive.infolist():
+            with archive.open(member) as member_file:
+                for line in member_file:
+                    if marker not in line:
+                        continue
+                    series = json.loads(line)
+                    if series.get('series_id') == series_id:
+                        return series
+    return None
+
+
+def get_crude_oil_rate_history_fallback(logger=None, conditional=True):
     '''
     Extracts historical crude oil prices in USD/bbl from markets.businessinsider.com
 
@@ -212,8 +822,10 @@ def get_crude_oil_rate_history_fallback(logger=None):
     to lag behind.
 
     Usage:  res_data = get_crude_oil_rate_history_fallback()
-    Before: Nothing
-    After:  @res_data is a dict containing crude oil price rate for the past year.
+    Before: @conditional is optional, set to False to get the data even if HTTP cache considers it
+            not modified.
+    After:  @res_data is a dict containing crude oil price rate for the past year, or
+            NOT_MODIFIED if HTTP cache is enabled and the data hasn't changed.
 
     Note: Data extracted from this should not be directly mixed with data from
           `get_crude_oil_rate_history` because these two data sources aren't guaranteed to be in
@@ -221,11 +833,31 @@ def get_crude_oil_rate_history_fallback(logger=None):
     '''
     if logger is not None:
         logger.info('Fetching fallback crude data from markets.businessinsider.com ..')
-    url = 'https://markets.businessinsider.com/commodities/oil-price/usd?type=brent'
-    session = requests.Session()
-    res = session.get(url, headers={'User-Agent': USER_AGENT})
+    session = get_http_session()
+    res = session.get(CRUDE_OIL_FALLBACK_URL)
     res.raise_for_status()
-    html = lxml.etree.fromstring(res.content, lxml.etree.HTMLParser())
+    now = datetime.datetime.utcnow()
+    chart_data_url = _crude_oil_fallback_chart_data_url(res.content, now)
+    content, modified = _request(
+        session,
+        'GET',
+        chart_data_url,
+        headers=CRUDE_OIL_FALLBACK_CHART_DATA_HEADERS,
+        conditional=conditional,
+        cache_key=chart_data_url.split('&from=')[0]  # date range moves daily, resource doesn't
+    )
+    if not modified:
+        if logger is not None:
+            logger.info('Fallback crude data not modified since last fetch.')
+        return NOT_MODIFIED
+    data = _parse_crude_oil_fallback_chart_data(content, now)
+    if logger is not None:
+        logger.info('Successfully fetched fallback crude data from markets.businessinsider.com')
+    return data
+
+
+def _crude_oil_fallback_chart_data_url(content, now):
+    html = lxml.etree.fromstring(content, lxml.etree.HTMLParser())
     script_text = None
     for script_element in html.findall('.//script'):
         if script_element.keys() == [] and 'var detailChartViewmodel = {' in script_element.text:
@@ -236,17 +868,15 @@ def get_crude_oil_rate_history_fallback(logger=None):
     re_tkdata = re.search(r'(?<="TKData" : ")([^"]*)(?=")', script_text)
     assert(re_instrument_type is not None)
     assert(re_tkdata is not None)
-    now = datetime.datetime.utcnow()
-    now_str = now.strftime('%Y-%m-%d')
     year_days = 365
     if (
         (calendar.isleap(now.year) and now.month > 2) or
         (calendar.isleap(now.year - 1) and now.month <= 2)
     ):
         year_days = 366
-    last_year = (datetime.datetime.utcnow() - datetime.timedelta(days=year_days))
+    last_year = (now - datetime.timedelta(days=year_days))
     then = (last_year - datetime.timedelta(days=(31 + 30)))
-    chart_data_url = (
+    return (
         'https://markets.businessinsider.com/Ajax/Chart_GetChartData?'
         'instrumentType={instrument_type}&'
         'tkData={tk_data}&'
@@ -258,19 +888,11 @@ def get_crude_oil_rate_history_fallback(logger=None):
         date_from=then.strftime('%Y%m%d'),
         date_to=now.strftime('%Y%m%d')
     )
-    chart_data_headers = {
-        'User-Agent': USER_AGENT,
-        'accept': 'application/json, text/plain, */*',
-        'accept-encoding': 'gzip, deflate',
-        'accept-language': 'en-US,en;q=0.9',
-        'referer': 'https://markets.businessinsider.com/commodities/oil-price/usd?type=brent',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-origin'
-    }
-    res2 = session.get(chart_data_url, headers=chart_data_headers)
-    res2.raise_for_status()
-    chart_data = res2.json()
+
+
+def _parse_crude_oil_fallback_chart_data(content, now):
+    now_str = now.strftime('%Y-%m-%d')
+    chart_data = json.loads(content)
     assert(type(chart_data) is list)
     data = {}
     for data_item in chart_data:
@@ -282,12 +904,12 @@ def get_crude_oil_rate_history_fallback(logger=None):
         item_value = float(data_item['Close'])
         if now_str > item_date_str:
             data[item_date_str] = item_value
-    if logger is not None:
-        logger.info('Successfully fetched fallback crude data from markets.businessinsider.com')
     return data
 
 
-def get_icelandic_fuel_price_history(req_date=None, logger=None):
+def get_icelandic_fuel_price_history(req_date=None, logger=None, gasvaktin_trends_content=None,
+                                     gasvaktin_state=None, fib_last_prices=None,
+                                     conditional=True):
     '''
     Extracts historical fuel price from FÍB and Gasvaktin.
 
@@ -296,9 +918,17 @@ def get_icelandic_fuel_price_history(req_date=None, logger=None):
 
     Usage:  res_data = get_icelandic_fuel_price_history(req_date)
     Before: @req_date is a datetime.datetime object containing date in the range 1996-09-01 to our
-            present date.
+            present date. @gasvaktin_trends_content is optional, contents of trends.min.json read
+            elsewhere (see get_gasvaktin_trends_from_git), fetched from GitHub if omitted.
+            @gasvaktin_state is optional, a dict of state kept between runs, see the @state
+            parameter of calculate_gasvaktin_mean_price_changes. @fib_last_prices is optional, if
+            the FÍB data (which ends 2016-04-19 and never changes) has already been stored, a dict
+            with the last stored FÍB 'petrol' and 'diesel' prices, FÍB isn't queried then.
+            @conditional is optional, set to False to get the data even if HTTP cache considers it
+            not modified.
     After:  @res_data is a dict containing mean fuel price rate change history from @req_date to
-            the present for petrol and diesel.
+            the present for petrol and diesel, or NOT_MODIFIED if HTTP cache is enabled and none
+            of the data sources have changed.
 
     Note: If not obvious from the above, prices before 2016-04-19 are read from the FÍB monthly
           mean data. Gasvaktin data is preferred over FÍB data because it's more detailed, however
@@ -308,111 +938,240 @@ def get_icelandic_fuel_price_history(req_date=None, logger=None):
         'petrol': {},
         'diesel': {}
     }
-    session = requests.Session()
-    gasvaktin_beginning = datetime.datetime(2016, 4, 19)
+    session = get_http_session()
     headers = {'User-Agent': USER_AGENT}
     last_petrol_price = None
     last_diesel_price = None
-    if req_date is None or req_date < gasvaktin_beginning:
+    modified = False
+    if fib_last_prices is not None:
+        if logger is not None:
+            logger.info('FÍB data already stored, skipping.')
+        last_petrol_price = fib_last_prices['petrol']
+        last_diesel_price = fib_last_prices['diesel']
+    elif req_date is None or req_date < GASVAKTIN_BEGINNING:
         if logger is not None:
             logger.info('Fetching and parsing FÍB data ..')
-        fib_url = (
-            'https://www.fib.is/is/billinn/eldsneytisvakt-fib/eldsneytisvaktin-throun?'
-            'companies=&'
-            'start=1995-10-01&'
-            'petrol=bensin'
-        )
-        res1 = session.get(fib_url, headers=headers)
+        res1 = session.get(FIB_FUEL_PRICE_URL, headers=headers)
         res1.raise_for_status()
         time.sleep(0.5)  # just to look polite
-        fib_petrol = 'https://www.fib.is/eldsneytisvakt_fib/data/mean_prices_bensin.csv'
-        fib_diesel = 'https://www.fib.is/eldsneytisvakt_fib/data/mean_prices_diesel.csv'
-        res2 = session.get(fib_petrol, headers=headers)
+        modified = True  # FÍB data is only fetched on initial load, never cached
+        res2 = session.get(FIB_MEAN_PRICES_PETROL_URL, headers=headers, stream=True)
         res2.raise_for_status()
-        fake_file1 = io.StringIO(res2.content.decode('utf-8'))
-        reader1 = csv.DictReader(fake_file1, delimiter=',')
-        for line in reader1:
-            date = line['date']
-            if gasvaktin_beginning.strftime('%Y-%m-%d') < date:
-                continue  # prefer Gasvaktin data over FÍB data because it's more detailed
-            if req_date is not None and date < req_date.strftime('%Y-%m-%d'):
-                continue  # throw data outside time range selection
-            if line['price_without_services'] != 'null':
-                price = float(line['price_without_services'])
-            else:
-                price = float(line['price_with_services'])
-            last_petrol_price = price
-            datetime.datetime.strptime(date, '%Y-%m-%d')
-            data['petrol'][date] = float(price)
+        data['petrol'], last_petrol_price = _parse_fib_mean_prices(res2.iter_lines(), req_date)
         time.sleep(0.2)  # just to look polite
-        res3 = session.get(fib_diesel, headers=headers)
+        res3 = session.get(FIB_MEAN_PRICES_DIESEL_URL, headers=headers, stream=True)
         res3.raise_for_status()
-        fake_file2 = io.StringIO(res3.content.decode('utf-8'))
-        reader2 = csv.DictReader(fake_file2, delimiter=',')
-        for line in reader2:
-            date = line['date']
-            if gasvaktin_beginning.strftime('%Y-%m-%d') < date:
-                continue  # prefer Gasvaktin data over FÍB data because it's more detailed
-            if req_date is not None and date < req_date.strftime('%Y-%m-%d'):
-                continue  # throw data outside time range selection
-            if line['price_without_services'] != 'null':
-                price = float(line['price_without_services'])
-            else:
-                price = float(line['price_with_services'])
-            last_diesel_price = price
-            datetime.datetime.strptime(date, '%Y-%m-%d')
-            data['diesel'][date] = float(price)
+        data['diesel'], last_diesel_price = _parse_fib_mean_prices(res3.iter_lines(), req_date)
     if logger is not None:
         logger.info('Fetching and parsing Gasvaktin data ..')
-    url = 'https://raw.githubusercontent.com/gasvaktin/gasvaktin/master/vaktin/trends.min.json'
-    res4 = session.get(url, headers=headers)
-    res4.raise_for_status()
-    gasvaktin_trends = res4.json()
-    current_date = datetime.datetime(2016, 4, 19)
-    today = datetime.datetime.now()
-    while current_date.strftime('%Y-%m-%d') < today.strftime('%Y-%m-%d'):
-        current_date_str = current_date.strftime('%Y-%m-%dT23:59')
-        if req_date is None or req_date.strftime('%Y-%m-%d') <= current_date.strftime('%Y-%m-%d'):
-            current_prices = {}
-            # programmers note: this double for loop implementation is bad and programmer should
-            # feel bad, but when programmer wrote this, programmer was feeling lazy and also
-            # programmer thinks bad implementation doesn't matter so much because dataset we're
-            # working with here doesn't grow fast enough to become a problem in near future (few
-            # years at least)
-            for company_key in gasvaktin_trends:
-                for change in gasvaktin_trends[company_key]:
-                    if change['timestamp'] < current_date_str:
-                        current_prices[company_key] = change
-                    else:
-                        break
-            # calculate mean petrol and diesel price
-            number_of_stations = 0
-            total_petrol_price = 0.0
-            total_diesel_price = 0.0
-            for company_key in current_prices:
-                if current_prices[company_key]['stations_count'] == 0:
-                    continue
-                stations_count = current_prices[company_key]['stations_count']
-                number_of_stations += stations_count
-                mean_petrol_price = current_prices[company_key]['mean_bensin95']
-                mean_diesel_price = current_prices[company_key]['mean_diesel']
-                total_petrol_price += (mean_petrol_price * stations_count)
-                total_diesel_price += (mean_diesel_price * stations_count)
-            current_petrol_price = round((total_petrol_price / number_of_stations), 2)
-            current_diesel_price = round((total_diesel_price / number_of_stations), 2)
-            if current_petrol_price != last_petrol_price:
-                data['petrol'][current_date.strftime('%Y-%m-%d')] = current_petrol_price
-                last_petrol_price = current_petrol_price
-            if current_diesel_price != last_diesel_price:
-                data['diesel'][current_date.strftime('%Y-%m-%d')] = current_diesel_price
-                last_diesel_price = current_diesel_price
-        current_date += datetime.timedelta(days=1)
+    if gasvaktin_trends_content is not None:
+        content4, modified4 = gasvaktin_trends_content, True
+    else:
+        content4, modified4 = _request(
+            session,
+            'GET',
+            GASVAKTIN_TRENDS_URL,
+            headers=headers,
+            conditional=conditional
+        )
+    if not (modified or modified4):
+        if logger is not None:
+            logger.info('Icelandic fuel price data not modified since last fetch.')
+        return NOT_MODIFIED
+    _add_gasvaktin_mean_price_changes(
+        data,
+        content4,
+        req_date,
+        last_petrol_price,
+        last_diesel_price,
+        gasvaktin_state
+    )
     if logger is not None:
         logger.info('Finished parsing icelandic fuel price data.')
     return data
 
 
-def get_isk_inflation_index_history(logger=None):
+def _parse_fib_mean_prices(lines, req_date=None):
+    # @lines are the lines (bytes) of a FÍB mean price CSV file, returns dict of prices and the
+    # last price kept
+    prices = {}
+    last_price = None
+    reader = csv.DictReader((line.decode('utf-8') for line in lines), delimiter=',')
+    for line in reader:
+        date = line['date']
+        if GASVAKTIN_BEGINNING.strftime('%Y-%m-%d') < date:
+            continue  # prefer Gasvaktin data over FÍB data because it's more detailed
+        if req_date is not None and date < req_date.strftime('%Y-%m-%d'):
+            continue  # throw data outside time range selection
+        if line['price_without_services'] != 'null':
+            price = float(line['price_without_services'])
+        else:
+            price = float(line['price_with_services'])
+        last_price = price
+        datetime.datetime.strptime(date, '%Y-%m-%d')
+        prices[date] = float(price)
+    return prices, last_price
+
+
+def _add_gasvaktin_mean_price_changes(data, gasvaktin_trends_content, req_date, last_petrol_price,
+                                      last_diesel_price, gasvaktin_state):
+    gasvaktin_trends = json.loads(gasvaktin_trends_content)
+    gasvaktin_petrol, gasvaktin_diesel = calculate_gasvaktin_mean_price_changes(
+        gasvaktin_trends,
+        req_date=req_date,
+        last_petrol_price=last_petrol_price,
+        last_diesel_price=last_diesel_price,
+        state=gasvaktin_state
+    )
+    data['petrol'].update(gasvaktin_petrol)
+    data['diesel'].update(gasvaktin_diesel)
+
+
+def get_gasvaktin_trends_from_git(repo_path, rev=None, known_sha=None, logger=None):
+    '''
+    Reads Gasvaktin trends data (vaktin/trends.min.json) from a local clone of the gasvaktin git
+    repository instead of downloading it from GitHub.
+
+    Usage:  res_data = get_gasvaktin_trends_from_git(repo_path, rev, known_sha)
+    Before: @repo_path is a path to a gasvaktin git repository. @rev is optional, a git revision
+            (commit hash, branch, tag ..) to read the file from, read from the working tree if
+            omitted. @known_sha is optional, git blob SHA of the file as last processed.
+    After:  @res_data is a dict containing 'sha' (git blob SHA of the file) and 'content' (file
+            contents, bytes), or NOT_MODIFIED if the blob SHA equals @known_sha. When reading
+            from a commit the file contents aren't read at all if the SHA is unchanged.
+    '''
+    if rev is None:
+        filename = os.path.join(repo_path, GASVAKTIN_TRENDS_PATH)
+        with open(filename, mode='rb') as trends_file:
+            content = trends_file.read()
+        # same hash as git hash-object would give the file
+        blob_sha = hashlib.sha1(b'blob %d\0' % (len(content), ) + content).hexdigest()
+        if blob_sha == known_sha:
+            content = None
+    else:
+        repo = git.Repo(repo_path)
+        blob = repo.commit(rev).tree / GASVAKTIN_TRENDS_PATH
+        blob_sha = blob.hexsha
+        content = None
+        if blob_sha != known_sha:
+            content = blob.data_stream.read()
+    if content is None:
+        if logger is not None:
+            logger.info('Gasvaktin trends data unchanged (blob %s).' % (blob_sha, ))
+        return NOT_MODIFIED
+    if logger is not None:
+        logger.info('Read Gasvaktin trends data from "%s" (%s, blob %s).' % (
+            repo_path,
+            'working tree' if rev is None else rev,
+            blob_sha
+        ))
+    return {'sha': blob_sha, 'content': content}
+
+
+def calculate_gasvaktin_mean_price_changes(gasvaktin_trends, req_date=None, end_date=None,
+                                           last_petrol_price=None, last_diesel_price=None,
+                                           state=None):
+    '''
+    Calculates daily station weighted national mean petrol and diesel price from Gasvaktin trends
+    data, and returns the days on which it changed.
+
+    Each company's change list is sorted by timestamp, so instead of scanning every company's
+    list from the start for each day we keep a cursor per company and move it forward past the
+    changes made before the end of the day, touching each change once. Cursors are placed at the
+    first calculated day with binary search, so days before @req_date (or before the day after
+    the one @state was saved on) cost nothing.
+
+    Usage:  petrol, diesel = calculate_gasvaktin_mean_price_changes(gasvaktin_trends)
+    Before: @gasvaktin_trends is the parsed trends.min.json dict, company keys with lists of
+            changes in ascending timestamp order. @req_date and @end_date are optional
+            datetime.datetime objects, days before @req_date are not reported and days from
+            @end_date (set to todays date if omitted) on are not calculated. @last_petrol_price
+            and @last_diesel_price are optional, the prices preceding the first reported day.
+            @state is optional, a dict as updated by a previous call (JSON serializable), or an
+            empty dict.
+    After:  @petrol and @diesel are dicts mapping dates (YYYY-MM-DD) to the national mean price
+            on days it changed, starting 2016-04-19. If @state was given it's updated with the
+            last calculated day, the mean prices on that day and each company's last change, so
+            the next call can pick up from there and only apply newer changes.
+    '''
+    petrol = {}
+    diesel = {}
+    if end_date is None:
+        end_date = datetime.datetime.now()
+    end_date_str = end_date.strftime('%Y-%m-%d')
+    current_date = datetime.datetime(2016, 4, 19)
+    current_prices = {}
+    if state is not None and state.get('date') is not None:
+        current_date = datetime.datetime.strptime(state['date'], '%Y-%m-%d')
+        current_date += datetime.timedelta(days=1)
+        current_prices = dict(state['companies'])
+        last_petrol_price = state['last_petrol_price']
+        last_diesel_price = state['last_diesel_price']
+    if req_date is not None and current_date < req_date:
+        current_date = datetime.datetime(req_date.year, req_date.month, req_date.day)
+    # place cursors after the changes made before the first calculated day
+    first_date_str = '%sT23:59' % (
+        (current_date - datetime.timedelta(days=1)).strftime('%Y-%m-%d'),
+    )
+    cursors = {}
+    for company_key in gasvaktin_trends:
+        changes = gasvaktin_trends[company_key]
+        low, high = 0, len(changes)
+        while low < high:
+            middle = (low + high) // 2
+            if changes[middle]['timestamp'] < first_date_str:
+                low = middle + 1
+            else:
+                high = middle
+        cursors[company_key] = low
+        if low > 0 and company_key not in current_prices:
+            current_prices[company_key] = changes[low - 1]
+    last_date_key = None
+    while current_date.strftime('%Y-%m-%d') < end_date_str:
+        current_date_key = current_date.strftime('%Y-%m-%d')
+        current_date += datetime.timedelta(days=1)
+        last_date_key = current_date_key
+        current_date_str = '%sT23:59' % (current_date_key, )
+        for company_key in gasvaktin_trends:
+            changes = gasvaktin_trends[company_key]
+            cursor = cursors[company_key]
+            while cursor < len(changes) and changes[cursor]['timestamp'] < current_date_str:
+                cursor += 1
+            if cursor > cursors[company_key]:
+                current_prices[company_key] = changes[cursor - 1]
+                cursors[company_key] = cursor
+        # calculate mean petrol and diesel price
+        number_of_stations = 0
+        total_petrol_price = 0.0
+        total_diesel_price = 0.0
+        for company_key in gasvaktin_trends:  # same summation order every day
+            if company_key not in current_prices:
+                continue
+            if current_prices[company_key]['stations_count'] == 0:
+                continue
+            stations_count = current_prices[company_key]['stations_count']
+            number_of_stations += stations_count
+            mean_petrol_price = current_prices[company_key]['mean_bensin95']
+            mean_diesel_price = current_prices[company_key]['mean_diesel']
+            total_petrol_price += (mean_petrol_price * stations_count)
+            total_diesel_price += (mean_diesel_price * stations_count)
+        current_petrol_price = round((total_petrol_price / number_of_stations), 2)
+        current_diesel_price = round((total_diesel_price / number_of_stations), 2)
+        if current_petrol_price != last_petrol_price:
+            petrol[current_date_key] = current_petrol_price
+            last_petrol_price = current_petrol_price
+        if current_diesel_price != last_diesel_price:
+            diesel[current_date_key] = current_diesel_price
+            last_diesel_price = current_diesel_price
+    if state is not None and last_date_key is not None:
+        state['date'] = last_date_key
+        state['last_petrol_price'] = last_petrol_price
+        state['last_diesel_price'] = last_diesel_price
+        state['companies'] = current_prices
+    return petrol, diesel
+
+
+def get_isk_inflation_index_history(logger=None, last_months=None, conditional=True):
     '''
     Extracts ISK inflation index data from Hagstofa Íslands.
 
@@ -422,10 +1181,14 @@ def get_isk_inflation_index_history(logger=None):
     reflected in the inflation index so if you want to calculate to/from old ISK amounts for one or
     another reason then you would want to simply multiply/divide the amount by 100.
 
-    Usage:  res_data = get_isk_inflation_index_history()
-    Before: Nothing
+    Usage:  res_data = get_isk_inflation_index_history(last_months)
+    Before: @last_months is optional, an int, if provided only the last @last_months months are
+            queried (PX-Web "top" filter on the month variable). @conditional is optional, set to
+            False to get the data even if HTTP cache considers it not modified.
     After:  @res_data is a dict containing monthly isk inflation index historical data from 1939-01
-            up to last month.
+            (or from @last_months months ago) up to last month, or NOT_MODIFIED if HTTP cache is
+            enabled and the data hasn't changed. Missing values are carried over from the month
+            before, or None if the first month queried is missing.
 
     Note: [From website, in icelandic, regarding index definition, which has changed over time]
           "Til grundvallar útreikningnum eru notuð birt gildi vísitölu framfærslukostnaðar og
@@ -433,14 +1196,30 @@ def get_isk_inflation_index_history(logger=None):
           fjórum sinnum á ári. Athugið að verðtrygging hefur ekki alltaf miðast við vísitölu
           framfærslukostnaðar eða vísitölu neysluverðs eingöngu."
     '''
-    today = datetime.datetime.strftime(datetime.datetime.utcnow(), '%Y-%m-%d')
-    session = requests.Session()
-    session.get('https://hagstofa.is/verdlagsreiknivel', headers={'User-Agent': USER_AGENT})
+    session = get_http_session()
+    session.get(ISK_INFLATION_INDEX_LANDING_URL)
     time.sleep(0.1)
-    url = 'https://px.hagstofa.is/pxis/api/v1/is/Efnahagur/visitolur/1_vnv/1_vnv/VIS01002.px'
+    headers, form_data_for_post = _isk_inflation_index_request(last_months)
+    content, modified = _request(
+        session,
+        'POST',
+        ISK_INFLATION_INDEX_URL,
+        headers=headers,
+        data=form_data_for_post,
+        conditional=conditional,
+        # the number of months queried grows monthly, keep one cache entry per kind of query
+        cache_key='%s?%s' % (ISK_INFLATION_INDEX_URL, 'top' if last_months is not None else 'all')
+    )
+    if not modified:
+        if logger is not None:
+            logger.info('ISK inflation index data not modified since last fetch.')
+        return NOT_MODIFIED
+    return _parse_isk_inflation_index_csv(content)
+
+
+def _isk_inflation_index_request(last_months=None):
     headers = {
         'Accept': '*/*',
-        'Accept-Encoding': 'gzip, deflate, br',
         'Accept-Language': 'en-US,en;q=0.9',
         'Connection': 'keep-alive',
         'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
@@ -452,13 +1231,26 @@ def get_isk_inflation_index_history(logger=None):
         'Sec-Fetch-Site': 'same-site',
         'User-Agent': USER_AGENT
     }
-    form_data_for_post = (
-        '{"query":[{"code":"Vísitala","selection":{"filter":"item","values":["CPI"]}},{"code":'
-        '"Grunnur","selection":{"filter":"item","values":["B1939"]}}],"response":{"format":"csv"}}'
+    query = [
+        {'code': 'Vísitala', 'selection': {'filter': 'item', 'values': ['CPI']}},
+        {'code': 'Grunnur', 'selection': {'filter': 'item', 'values': ['B1939']}}
+    ]
+    if last_months is not None:
+        assert(type(last_months) is int and last_months > 0)
+        query.append(
+            {'code': 'Mánuður', 'selection': {'filter': 'top', 'values': [str(last_months)]}}
+        )
+    form_data_for_post = json.dumps(
+        {'query': query, 'response': {'format': 'csv'}},
+        ensure_ascii=False,
+        separators=(',', ':')
     ).encode('utf-8')
-    res = session.post(url, headers=headers, data=form_data_for_post)
-    res.raise_for_status()
-    content = res.content.decode('utf-8')
+    return headers, form_data_for_post
+
+
+def _parse_isk_inflation_index_csv(content):
+    today = datetime.datetime.strftime(datetime.datetime.utcnow(), '%Y-%m-%d')
+    content = content.decode('utf-8')
     first_line = True
     line_regex = r'(?:\")([0123456789]*)(?:M)([0123456789]*)(?:\",)([.]|[0123456789]*)'
     content_lines = content.split('\r\n')
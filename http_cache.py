@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import hashlib
+import json
+import os
+import threading
+
+
+class HTTPCache(object):
+    '''
+    On-disk conditional HTTP cache, keyed by request method, URL and request body.
+
+    For each request we keep the ETag and Last-Modified response headers, a SHA-256 hash of the
+    response body and the body itself. Requests are sent with If-None-Match / If-Modified-Since
+    headers when we have them, and a response is considered not modified if the server answers
+    304 Not Modified or if the body hash matches the stored one (for servers which ignore the
+    conditional headers).
+
+    Requests whose URL or body changes between runs while the resource stays the same (like a date
+    range ending today) should be given a stable @cache_key, in place of URL and body, so they
+    reuse one cache entry instead of adding a new one every run.
+
+    New cache entries are kept in memory until save() is called, so the caller can choose to only
+    persist them once the fetched data has been processed and stored. If a run fails midway the
+    next run sees the content as modified and processes it again.
+
+    Usage:  cache = HTTPCache(directory)
+            content, modified = cache.request(session, 'GET', url, cache_key=cache_key)
+            ..
+            cache.save()
+    Before: @directory is a path to a directory for the cache files, created if missing.
+            @cache_key is optional, a str identifying the requested resource.
+    After:  @content is the response body (bytes), the cached one on 304, @modified is False if
+            the content is the same as when cache.save() was last called.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pending = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, method, url, data=None):
+        key_hash = hashlib.sha256()
+        key_hash.update(method.upper().encode('utf-8'))
+        key_hash.update(b'\n')
+        key_hash.update(url.encode('utf-8'))
+        key_hash.update(b'\n')
+        if data is not None:
+            key_hash.update(data if type(data) is bytes else str(data).encode('utf-8'))
+        return key_hash.hexdigest()
+
+    def load(self, key):
+        meta_filename = os.path.join(self.directory, '%s.json' % (key, ))
+        body_filename = os.path.join(self.directory, '%s.body' % (key, ))
+        if not os.path.isfile(meta_filename) or not os.path.isfile(body_filename):
+            return None, None
+        with open(meta_filename, mode='r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        with open(body_filename, mode='rb') as body_file:
+            content = body_file.read()
+        if hashlib.sha256(content).hexdigest() != meta.get('body_sha256'):
+            return None, None  # corrupted or partially written entry
+        return meta, content
+
+    def request(self, session, method, url, headers=None, data=None, conditional=True,
+                cache_key=None, **kwargs):
+        if cache_key is None:
+            key = self.key(method, url, data)
+        else:
+            key = self.key(method, cache_key)
+        meta, cached_content = None, None
+        if conditional:  # otherwise fetch unconditionally, content always reported modified
+            meta, cached_content = self.load(key)
+        request_headers = dict(headers or {})
+        if meta is not None:
+            if meta.get('etag') is not None:
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified') is not None:
+                request_headers['If-Modified-Since'] = meta['last_modified']
+        res = session.request(method, url, headers=request_headers, data=data, **kwargs)
+        if res.status_code == 304 and meta is not None:
+            return cached_content, False
+        res.raise_for_status()
+        content = res.content
+        body_sha256 = hashlib.sha256(content).hexdigest()
+        if meta is not None and meta.get('body_sha256') == body_sha256:
+            return content, False
+        with self.lock:
+            self.pending[key] = ({
+                'method': method.upper(),
+                'url': url,
+                'etag': res.headers.get('ETag'),
+                'last_modified': res.headers.get('Last-Modified'),
+                'body_sha256': body_sha256
+            }, content)
+        return content, True
+
+    def save(self):
+        '''
+        Persists cache entries for responses fetched since last save() to disk.
+        '''
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+        for key, (meta, content) in pending.items():
+            meta_filename = os.path.join(self.directory, '%s.json' % (key, ))
+            body_filename = os.path.join(self.directory, '%s.body' % (key, ))
+            with open('%s.tmp' % (body_filename, ), mode='wb') as body_file:
+                body_file.write(content)
+            os.replace('%s.tmp' % (body_filename, ), body_filename)
+            with open('%s.tmp' % (meta_filename, ), mode='w', encoding='utf-8') as meta_file:
+                json.dump(meta, meta_file, indent=4)
+            os.replace('%s.tmp' % (meta_filename, ), meta_filename)
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import datetime
+import functools
+
+
+def easter_sunday(year):
+    '''
+    Calculates date of Easter Sunday for a given year (Gregorian calendar, anonymous algorithm).
+
+    Usage:  res_date = easter_sunday(year)
+    Before: @year is an int.
+    After:  @res_date is a datetime.date object containing the date of Easter Sunday in @year.
+    '''
+    a = year % 19
+    b = year // 100
+    c = year % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = ((h + l - 7 * m + 114) % 31) + 1
+    return datetime.date(year, month, day)
+
+
+@functools.lru_cache(maxsize=None)
+def get_icelandic_bank_holidays(year):
+    '''
+    Precomputed icelandic holidays on which Central Bank of Iceland does not register exchange
+    rates, fixed date holidays as well as Easter relative holidays.
+
+    Usage:  res_data = get_icelandic_bank_holidays(year)
+    Before: @year is an int, 1981 or later.
+    After:  @res_data is a dict with datetime.date keys and holiday names as values.
+
+    Note: Only holidays on which no exchange rate has been registered since 1981 are included here,
+          checked against the exchange rate history. Days like 2 January and 31 December, which
+          have been bank holidays only in some years, are left to be learned from sedlabanki.is
+          responses instead.
+    '''
+    easter = easter_sunday(year)
+    first_day_of_summer = datetime.date(year, 4, 19)  # first thursday after 18 April
+    while first_day_of_summer.weekday() != 3:
+        first_day_of_summer += datetime.timedelta(days=1)
+    commerce_day = datetime.date(year, 8, 1)  # first monday of August
+    while commerce_day.weekday() != 0:
+        commerce_day += datetime.timedelta(days=1)
+    holidays = {
+        easter - datetime.timedelta(days=3): 'Skírdagur',
+        easter - datetime.timedelta(days=2): 'Föstudagurinn langi',
+        easter: 'Páskadagur',
+        easter + datetime.timedelta(days=1): 'Annar í páskum',
+        first_day_of_summer: 'Sumardagurinn fyrsti',
+        datetime.date(year, 5, 1): 'Verkalýðsdagurinn',
+        easter + datetime.timedelta(days=39): 'Uppstigningardagur',
+        easter + datetime.timedelta(days=49): 'Hvítasunnudagur',
+        easter + datetime.timedelta(days=50): 'Annar í hvítasunnu',
+        datetime.date(year, 6, 17): 'Þjóðhátíðardagurinn',
+        commerce_day: 'Frídagur verslunarmanna',
+        datetime.date(year, 12, 25): 'Jóladagur',
+        datetime.date(year, 12, 26): 'Annar í jólum',
+    }
+    if year > 1981:  # exchange rate was registered on 1981-01-01, the day of the currency change
+        holidays[datetime.date(year, 1, 1)] = 'Nýársdagur'
+    if year >= 1999:
+        holidays[datetime.date(year, 12, 24)] = 'Aðfangadagur jóla'
+    return holidays
+
+
+def get_icelandic_bank_holiday(req_date):
+    '''
+    Returns holiday name if @req_date (datetime.date or datetime.datetime) is a precomputed
+    icelandic bank holiday, otherwise None.
+    '''
+    date = datetime.date(req_date.year, req_date.month, req_date.day)
+    return get_icelandic_bank_holidays(date.year).get(date)
+
+
+def is_icelandic_business_day(req_date):
+    '''
+    Returns True if @req_date (datetime.date or datetime.datetime) is neither a weekend nor a
+    precomputed icelandic bank holiday.
+    '''
+    if req_date.weekday() in (5, 6):
+        return False
+    return get_icelandic_bank_holiday(req_date) is None
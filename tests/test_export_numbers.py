@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import endpoints
+
+
+def test_parse_export_number_decimal_comma():
+    assert(endpoints._parse_export_number('1.234,56') == 1234.56)
+    assert(endpoints._parse_export_number('138,27') == 138.27)
+
+
+def test_parse_export_number_decimal_point():
+    assert(endpoints._parse_export_number('1,234.56') == 1234.56)
+    assert(endpoints._parse_export_number('138.27') == 138.27)
+
+
+def test_parse_export_number_missing():
+    assert(endpoints._parse_export_number(None) is None)
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import datetime
+
+import benchmark
+
+
+def test_pull_parser_matches_tree_parser():
+    content = benchmark.synthetic_isk_exchange_rate_page(datetime.datetime(2024, 1, 5))
+    assert(
+        benchmark.parse_isk_exchange_rate_page_pull(content) ==
+        benchmark.parse_isk_exchange_rate_page_tree(content)
+    )
+
+
+def test_pull_parser_matches_tree_parser_on_nested_tables():
+    content = benchmark.synthetic_isk_exchange_rate_page(
+        datetime.datetime(2024, 1, 5),
+        nested=True
+    )
+    shown_date_str, rows = benchmark.parse_isk_exchange_rate_page_pull(content)
+    assert(shown_date_str == 'Skráning: 05.01.2024')
+    assert((shown_date_str, rows) == benchmark.parse_isk_exchange_rate_page_tree(content))
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------------------------- #
+import comparison
+import database.db
+
+
+def setup_function(function):
+    database.db.setup_connection('sqlite://')
+    database.db.init_db()
+
+
+def teardown_function(function):
+    database.db.session.remove()
+    database.db.engine.dispose()
+
+
+def test_hot_queries_use_indexes():
+    assert(comparison.check_query_plans(database.db) == [])
+
+
+def test_dropped_index_is_reported():
+    database.db.session.execute('DROP INDEX ix_exchange_rate_of_isk_date')
+    failures = comparison.check_query_plans(database.db)
+    assert('plan_isk_rate_fetch: ISK rate gaps: full scan of exchange_rate_of_isk.' in failures)
+    unused_index_failure = (
+        'store_isk_rate_data: existing ISK rates in date range: '
+        'index ix_exchange_rate_of_isk_date not used.'
+    )
+    assert(unused_index_failure in failures)